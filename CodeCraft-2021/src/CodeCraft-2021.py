@@ -1,14 +1,159 @@
+import io
+import os
+import json
+import re
 import sys
+import mmap
+import time
+import queue
+import bisect
+import pstats
+import cProfile
+import logging
+import threading
+import itertools
+import multiprocessing
 import numpy as np
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
 
 
-SERVER_INFO = dict()  # 服务器信息字典 {服务器名:{CPU核数: ,内存大小: ,硬件成本: ,运行成本: ,综合性价比: }}
 A_CPU = 0.15 # 硬件性价比系数
 A_MEM = 0.15 # 硬件性价比系数
 B_CPU = 0.35 # 运行性价比系数
 B_MEM = 0.35 # 运行性价比系数
-def generate_server(server_type: str, cpu_cores: str, memory_size: str, server_cost: str, power_cost: str):
+PLACEMENT_POLICY = 'auto'  # 放置策略 'auto'(集群不超过VECTOR_MAX_SERVERS台时同'vector'，之后换成'best_fit') or 'vector'(numpy扫描全部服务器) or 'first_fit'(按购买顺序首次适应) or 'best_fit'(剩余资源最小适应)
+VECTOR_MAX_SERVERS = 5000  # 'auto'时向量化扫描的集群规模上限，再大时O(集群规模)的扫描比线段树慢
+FIT_SCORE = 'tightest'  # 'vector'放置时的候选打分，见FIT_SCORES
+DAYS_BUCKET = 8  # 剩余天数分桶宽度，购买决策按桶缓存
+DISTRIBUTION_MODE = 'greedy'  # 分配方式 'greedy'(按到达顺序逐个贪心) or 'batch'(整天批量装箱)
+MIGRATION_RATIO = 0.005  # 每天迁移次数上限占存活虚拟机数的比例(5/1000)，为0时不迁移
+MIGRATION_UTILIZATION = 0.9  # 已开机服务器平均利用率高于此值时没有空间腾挪，当天跳过迁移
+LOOKAHEAD_DAYS = 10  # 前瞻天数K：购买时参考之后K天已解析的请求，为0时只看当天（K越大预读的请求越多）
+REQUEST_ORDER = 'arrival'  # greedy时单/双节点请求各自的处理顺序 'arrival'(到达顺序) or 'largest'(主导资源占比从大到小)
+DAY_PLANS = ()  # 每天用撤销日志试算的候选方案[(分配方式, 处理顺序)]，少于2个时不试算，为空时用上面两项
+TUNE_BUDGET = 0  # 并行搜索策略的时间预算(秒)，为0时直接用上面的默认策略
+TUNE_WORKERS = None  # 搜索策略的进程数，默认CPU核数
+LOGGER = logging.getLogger('CodeCraft-2021')  # 调试日志只写stderr，stdout只输出判题结果
+LOG_DEBUG = False  # 热路径先判断这个开关，关闭时不做任何格式化
+def init_logger(level: str = None):
+    """
+    初始化日志
+    :param level: 日志级别，默认取环境变量CODECRAFT_LOG，没有则为WARNING
+    :return: 无
+    """
+    global LOG_DEBUG
+    logging.basicConfig(stream=sys.stderr, format='%(levelname)s %(message)s')
+    LOGGER.setLevel((level or os.environ.get('CODECRAFT_LOG', 'WARNING')).upper())
+    LOG_DEBUG = LOGGER.isEnabledFor(logging.DEBUG)
+PROFILE = False  # 是否统计各阶段耗时，热路径先判断这个开关，关闭时不计时
+PROFILE_PATH = None  # 各阶段耗时和计数导出的JSON路径
+class Profiler:
+    """
+    各阶段耗时：distribution()在阶段边界调用lap()，记录从上一个边界到现在的耗时，
+    purchase是嵌套在放置阶段中的购买决策耗时；计数从容量索引、成本核算等处直接读取，不在热路径上统计；
+    可选用cProfile采集函数级耗时
+    """
+    PHASES = ('parse', 'classify', 'migration', 'double', 'single', 'batch', 'delete', 'output', 'purchase')
+
+    def __init__(self):
+        self.seconds = {phase: 0.0 for phase in self.PHASES}  # 每个阶段的累计耗时
+        self.max_seconds = {phase: 0.0 for phase in self.PHASES}  # 每个阶段单次最长耗时
+        self.calls = {phase: 0 for phase in self.PHASES}
+        self.last = time.perf_counter()
+        self.cprofile = None
+
+    def lap(self, phase: str):
+        """
+        记录从上一个阶段边界到现在的耗时
+        :param phase: 阶段名
+        :return: 无
+        """
+        now = time.perf_counter()
+        self.add(phase, now - self.last)
+        self.last = now
+
+    def add(self, phase: str, seconds: float):
+        """
+        累加一个阶段的耗时
+        :param phase: 阶段名
+        :param seconds: 耗时(秒)
+        :return: 无
+        """
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+        if seconds > self.max_seconds[phase]:
+            self.max_seconds[phase] = seconds
+
+    def start_cprofile(self):
+        """
+        开始cProfile采集
+        :return: 无
+        """
+        self.cprofile = cProfile.Profile()
+        self.cprofile.enable()
+
+    def counters(self) -> dict:
+        """
+        :return: 放置查询次数、查询扫描的条目数、放不下改为购买的次数、购买、迁移、回滚等计数
+        """
+        finds = NODE_INDEX.finds + DOUBLE_INDEX.finds if NODE_INDEX is not None else 0
+        scanned = NODE_INDEX.scanned + DOUBLE_INDEX.scanned if NODE_INDEX is not None else 0
+        return {
+            'placement_queries': finds,
+            'scanned': scanned,
+            'scanned_per_query': scanned / finds if finds else 0.0,
+            'fallbacks': NODE_INDEX.misses + DOUBLE_INDEX.misses if NODE_INDEX is not None else 0,
+            'purchases': LEDGER.servers,
+            'migrations': sum(day[0] for day in MIGRATION_LOG),
+            'rollbacks': CLUSTER.rollbacks,
+            'live_vms': len(VM_LOCATION),
+        }
+
+    def as_dict(self, top: int = 30) -> dict:
+        """
+        :param top: cProfile结果保留累计耗时最多的函数个数
+        :return: 可导出JSON的统计结果
+        """
+        result = {'policy': PLACEMENT_POLICY, 'mode': DISTRIBUTION_MODE, 'days': len(LEDGER.series['day']),
+                  'seconds': self.seconds, 'max_seconds': self.max_seconds, 'calls': self.calls,
+                  'counters': self.counters()}
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            stats = pstats.Stats(self.cprofile)
+            functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top]
+            result['cprofile'] = [{'function': "%s:%d(%s)" % key, 'calls': value[1], 'tottime': value[2],
+                                   'cumtime': value[3]} for key, value in functions]
+        return result
+
+    def dump(self, path: str):
+        """
+        导出JSON
+        :param path: 文件路径
+        :return: 无
+        """
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+
+PROFILER = Profiler()
+
+
+def init_profiler(path: str = None, use_cprofile: bool = None):
+    """
+    初始化耗时统计
+    :param path: JSON导出路径，默认取环境变量CODECRAFT_PROFILE，为空时不统计
+    :param use_cprofile: 是否同时用cProfile采集，默认取环境变量CODECRAFT_CPROFILE(=1)
+    :return: 无
+    """
+    global PROFILE, PROFILE_PATH, PROFILER
+    PROFILE_PATH = path or os.environ.get('CODECRAFT_PROFILE')
+    PROFILE = bool(PROFILE_PATH)
+    PROFILER = Profiler()
+    if PROFILE and (use_cprofile if use_cprofile is not None else os.environ.get('CODECRAFT_CPROFILE') == '1'):
+        PROFILER.start_cprofile()
+INFEASIBLE_COST = np.iinfo(np.int64).max  # 放不下时的成本
+def generate_server(server_type: str, cpu_cores: str, memory_size: str, server_cost: str, power_cost: str) -> tuple:
     """
     创建服务器信息
     :param server_type: 服务器种类名
@@ -16,13 +161,8 @@ def generate_server(server_type: str, cpu_cores: str, memory_size: str, server_c
     :param memory_size: 服务器MEMORY大小
     :param server_cost: 服务器硬件成本
     :param power_cost: 服务器运行成本
-    :return: 无
+    :return: (种类名, CPU核数, 内存大小, 硬件成本, 运行成本, 综合性价比)
     """
-    global SERVER_INFO
-    ab_cpu_cores = int(cpu_cores) / 2
-    ab_memory_size = int(memory_size) / 2
-    server_cpu_memory_a = np.array([ab_cpu_cores, ab_memory_size])
-    server_cpu_memory_b = np.array([ab_cpu_cores, ab_memory_size])
     cpu_per_hc = float(server_cost) / float(cpu_cores)  # cpu硬件性价比
     cpu_per_rc = float(power_cost) / float(cpu_cores)   # cpu运行性价比
     mem_per_hc = float(server_cost) / float(memory_size)    # memory硬件性价比
@@ -30,340 +170,1561 @@ def generate_server(server_type: str, cpu_cores: str, memory_size: str, server_c
     # com_per = ((float(server_cost)/float(cpu_cores))*float(cpu_cores)) / (int(memory_size)+int(cpu_cores)) \
               #+ ((float(server_cost)/float(memory_size))*float(memory_size)) / (int(memory_size)+int(cpu_cores))
     com_per = A_CPU * cpu_per_hc + B_CPU * cpu_per_rc + A_MEM * mem_per_hc + B_MEM * mem_per_rc # 综合性价比
-    SERVER_INFO[server_type] = {'cpu_cores': int(cpu_cores), 'memory_size': int(memory_size),
-                                'server_cost': int(server_cost), 'power_cost': int(power_cost),
-                                'server_cpu_memory_a': server_cpu_memory_a,
-                                'server_cpu_memory_b': server_cpu_memory_b,
-                                'com_per': com_per
-                                }
+    return server_type.strip(), int(cpu_cores), int(memory_size), int(server_cost), int(power_cost), com_per
 
 
-VM_INFO = dict()    # 虚拟机信息字典{虚拟机名:{核数: ,内存大小: ,单/双节点: }}
-def generate_vm(vm_type: str, vm_cpu_cores: str, vm_memory_size: str, single_or_double: str):
+def generate_vm(vm_type: str, vm_cpu_cores: str, vm_memory_size: str, single_or_double: str) -> tuple:
     """
     创建虚拟机信息
     :param vm_type: 虚拟机种类名
     :param vm_cpu_cores: 虚拟机CPU核数
     :param vm_memory_size: 虚拟机MEMORY大小
     :param single_or_double: 单节点还是双节点
+    :return: (种类名, CPU核数, 内存大小, 单/双节点)
+    """
+    return vm_type.strip(), int(vm_cpu_cores), int(vm_memory_size), int(single_or_double)
+
+
+class Catalog:
+    """
+    列存的种类表：每一列是连续的int64数组(array.array，按下标取值直接得到int，不会装箱成numpy标量)，
+    vec()返回共享同一块内存的numpy视图，用于向量化查询
+    """
+    def __init__(self, names):
+        self.names = list(names)  # 下标 -> 种类名
+        self.index = {name: no for no, name in enumerate(self.names)}  # 种类名 -> 下标
+        self._vec = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def vec(self, column: str) -> np.ndarray:
+        """
+        某一列的numpy视图
+        :param column: 列名
+        :return: np.ndarray（只读视图，不拷贝）
+        """
+        if column not in self._vec:
+            values = getattr(self, column)
+            self._vec[column] = np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+        return self._vec[column]
+
+
+class ServerCatalog(Catalog):
+    """
+    服务器种类表，下标即服务器种类编号(server_no)
+    """
+    def __init__(self, rows):
+        """
+        :param rows: generate_server返回的行
+        """
+        super().__init__(row[0] for row in rows)
+        self.cpu = array('q', [row[1] for row in rows])
+        self.memory = array('q', [row[2] for row in rows])
+        self.node_cpu = array('q', [row[1] // 2 for row in rows])  # A、B结点各一半
+        self.node_memory = array('q', [row[2] // 2 for row in rows])
+        self.server_cost = array('q', [row[3] for row in rows])
+        self.power_cost = array('q', [row[4] for row in rows])
+        self.com_per = array('d', [row[5] for row in rows])
+        self.purchase_cache = {}  # {(虚拟机形状编号, 剩余天数桶):服务器种类下标}
+        self.fit = None  # 当前顺序下的(虚拟机形状 x 服务器种类)可行性表，见fit_table()
+
+    def purchase_costs(self, days) -> np.ndarray:
+        """
+        每种服务器运行days天的总成本
+        :param days: 天数
+        :return: 硬件成本+能耗成本*days
+        """
+        return self.vec('server_cost') + self.vec('power_cost') * days
+
+    def cheapest(self, feasible, days) -> int:
+        """
+        一次扫描全部种类，选出能放下虚拟机的总成本最低的服务器种类
+        :param feasible: 每种服务器能否放下的bool数组（fit_table()的一行）
+        :param days: 运行天数
+        :return: 服务器种类下标，没有则返回-1
+        """
+        costs = np.where(feasible, self.purchase_costs(days), INFEASIBLE_COST)
+        server_no = int(costs.argmin())
+        return server_no if costs[server_no] < INFEASIBLE_COST else -1
+
+    def cheapest_for_demand(self, feasible, pending_cpu, pending_memory, days) -> int:
+        """
+        批量装箱时的购买选择：能放下虚拟机，且 总成本/能吸收的待分配需求占比 最小
+        :param feasible: 每种服务器能否放下的bool数组（fit_table()的一行）
+        :param pending_cpu: 当天还没放置的CPU总需求（含当前虚拟机）
+        :param pending_memory: 当天还没放置的内存总需求（含当前虚拟机）
+        :param days: 运行天数
+        :return: 服务器种类下标，没有则返回-1
+        """
+        # 按瓶颈资源计算能吸收的需求占比，CPU、内存比例和需求接近的服务器更划算
+        absorb = np.minimum(np.minimum(self.vec('cpu'), pending_cpu) / pending_cpu,
+                            np.minimum(self.vec('memory'), pending_memory) / pending_memory)
+        costs = np.where(feasible, self.purchase_costs(days) / absorb, np.inf)
+        server_no = int(costs.argmin())
+        return server_no if np.isfinite(costs[server_no]) else -1
+
+    def rows(self):
+        """
+        :return: 与generate_server相同格式的行
+        """
+        return list(zip(self.names, self.cpu, self.memory, self.server_cost, self.power_cost, self.com_per))
+
+
+class VmCatalog(Catalog):
+    """
+    虚拟机种类表，下标即请求中的虚拟机型号下标(vm_no)
+    """
+    def __init__(self, rows):
+        """
+        :param rows: generate_vm返回的行
+        """
+        super().__init__(row[0] for row in rows)
+        self.cpu = array('q', [row[1] for row in rows])
+        self.memory = array('q', [row[2] for row in rows])
+        self.double = array('q', [row[3] for row in rows])
+
+
+class ShapeTable:
+    """
+    虚拟机形状表：CPU、内存、单/双节点都相同的虚拟机种类共用一个形状编号，双节点的单结点需求预先减半；
+    加载种类表时一次算好(形状 x 服务器种类)的可行性表，购买时只查表。表按加载时的服务器种类顺序计算，
+    sort_performance重新编号后按种类名换列并缓存，多次模拟、搜索策略时不再重新计算
+    """
+    def __init__(self, vm_catalog, server_catalog):
+        """
+        :param vm_catalog: 虚拟机种类表
+        :param server_catalog: 服务器种类表（任意顺序）
+        """
+        shapes = {}  # (CPU, 内存, 单/双节点) -> 形状编号
+        self.vm_shape = array('q', [shapes.setdefault(shape, len(shapes)) for shape in
+                                    zip(vm_catalog.cpu, vm_catalog.memory, vm_catalog.double)])
+        self.shapes = list(shapes)  # 形状编号 -> (CPU, 内存, 单/双节点)
+        self.vm_infos = [self.shapes[shape] for shape in self.vm_shape]  # 虚拟机种类下标 -> (CPU, 内存, 单/双节点)
+        self.node_cpu = np.array([cpu // 2 if double else cpu for cpu, _, double in self.shapes], dtype=np.int64)
+        self.node_memory = np.array([memory // 2 if double else memory for _, memory, double in self.shapes],
+                                    dtype=np.int64)
+        # 空服务器单个结点能否放下
+        self.feasible = (server_catalog.vec('node_cpu') >= self.node_cpu[:, None]) \
+                        & (server_catalog.vec('node_memory') >= self.node_memory[:, None])
+        self.server_columns = dict(server_catalog.index)  # 种类名 -> 计算时的列
+        self.tables = {}  # {服务器种类名顺序: 可行性表}
+
+    def fit_table(self, server_catalog) -> np.ndarray:
+        """
+        按server_catalog的种类顺序换列后的可行性表，同一顺序只换一次
+        :param server_catalog: 服务器种类表
+        :return: bool数组(形状 x 服务器种类)
+        """
+        key = tuple(server_catalog.names)
+        if key not in self.tables:
+            columns = np.array([self.server_columns[name] for name in key], dtype=np.intp)
+            self.tables[key] = self.feasible[:, columns]
+        return self.tables[key]
+
+
+SERVER_CATALOG = ServerCatalog([])  # 服务器种类表
+VM_CATALOG = VmCatalog([])  # 虚拟机种类表
+SHAPES = ShapeTable(VM_CATALOG, SERVER_CATALOG)  # 虚拟机形状表，与种类表一起创建
+
+
+OP_ADD, OP_DEL = 0, 1  # 请求操作码
+REQUEST_PATTERN = re.compile(rb'\((a|d)[a-z]*,\s*(?:([^,\s)]+),\s*)?(\d+)\)')  # (add, 虚拟机型号, ID) or (del, ID)
+USE_TRACE_CACHE = False  # 是否使用.npz二进制缓存（重复跑同一份训练数据时直接加载）
+READ_AHEAD_DAYS = 2  # 后台线程预读解析的天数(队列长度)，为0时在主线程边读边分配
+TOTAL_DAYS = 0  # 请求总天数T
+VISIBLE_DAYS = 0  # 交互输入("T K")时已经给出的天数K，之后每输出一天才给出下一天；为0表示请求一次全部给出
+
+
+def open_trace(path: str):
+    """
+    以mmap方式打开训练数据
+    :param path: 训练数据路径
+    :return: mmap对象（支持readline）
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_catalog(reader):
+    """
+    读取服务器和虚拟机信息
+    :param reader: 支持readline的对象(mmap/二进制文件)
+    :return: (服务器信息行, 虚拟机信息行)
+    """
+    server_lines = [reader.readline().decode().strip() for _ in range(int(reader.readline()))]
+    vm_lines = [reader.readline().decode().strip() for _ in range(int(reader.readline()))]
+    build_catalog(server_lines, vm_lines)
+    return server_lines, vm_lines
+
+
+def build_catalog(server_lines, vm_lines):
+    """
+    根据信息行创建服务器和虚拟机信息
+    :param server_lines: ["(型号, CPU 核数, 内存大小, 硬件成本, 每日能耗成本)"]
+    :param vm_lines: ["(型号, CPU 核数, 内存大小, 是否双节点部署)"]
     :return: 无
     """
-    global VM_INFO
-    VM_INFO[vm_type] = {'vm_cpu_cores': int(vm_cpu_cores), 'vm_memory_size': int(vm_memory_size),
-                        'single_or_double': int(single_or_double)}
+    global SERVER_CATALOG, VM_CATALOG, SHAPES
+    SERVER_CATALOG = ServerCatalog([generate_server(*server_temp[1:-1].split(',')) for server_temp in server_lines])
+    VM_CATALOG = VmCatalog([generate_vm(*vm_temp[1:-1].split(',')) for vm_temp in vm_lines])
+    SHAPES = ShapeTable(VM_CATALOG, SERVER_CATALOG)
 
 
-OP_LIST = defaultdict(list)  # 每天的操作字典 {day:[每天的操作]}
-def operation_read(day: int, op: str, **kwargs):
+def read_day_chunk(reader, request_num: int) -> bytes:
     """
-    将操作添加到请求列表
-    :param day: 第day天
-    :param op: 操作指令 'add' or 'del'
-    :param kwargs: 接受关键字参数，'vm_type'
+    一次取出一天的R条请求
+    :param reader: mmap或二进制文件
+    :param request_num: 请求条数
+    :return: 这一天请求的原始字节
+    """
+    if isinstance(reader, mmap.mmap):
+        start = end = reader.tell()
+        for _ in range(request_num):
+            end = reader.find(b'\n', end) + 1 or len(reader)
+        reader.seek(end)
+        return reader[start:end]
+    return b''.join([reader.readline() for _ in range(request_num)])
+
+
+def parse_day(chunk: bytes, vm_no: dict):
+    """
+    解析一天的请求为紧凑数组
+    :param chunk: 这一天请求的原始字节
+    :param vm_no: {虚拟机型号(bytes):下标}
+    :return: (操作码int8数组, 虚拟机型号下标int32数组(del为-1), 虚拟机ID int64数组)
+    """
+    matches = REQUEST_PATTERN.findall(chunk)
+    ops = np.array([OP_ADD if op == b'a' else OP_DEL for op, _, _ in matches], dtype=np.int8)
+    types = np.array([vm_no[vm_type] if vm_type else -1 for _, vm_type, _ in matches], dtype=np.int32)
+    ids = np.array([int(vm_id) for _, _, vm_id in matches], dtype=np.int64)
+    return ops, types, ids
+
+
+def iter_requests(reader, total_days: int, cache_path=None, header=None):
+    """
+    逐天解析请求的生成器，读完一天即可开始分配
+    :param reader: 已读完服务器和虚拟机信息以及天数T的mmap或二进制文件
+    :param total_days: 天数T
+    :param cache_path: 不为空时在读完后写入.npz缓存
+    :param header: 写缓存用的(服务器信息行, 虚拟机信息行, [源文件大小, 修改时间])
+    :return: 每天产出(ops, types, ids)
+    """
+    vm_no = {name.encode(): i for name, i in VM_CATALOG.index.items()}
+    days = []
+    for _ in range(total_days):
+        day = parse_day(read_day_chunk(reader, int(reader.readline())), vm_no)
+        if cache_path:
+            days.append(day)
+        yield day
+    if cache_path:
+        write_trace_cache(cache_path, header, days)
+
+
+def write_trace_cache(cache_path: str, header: tuple, days: list):
+    """
+    写入.npz缓存
+    :param cache_path: 缓存路径
+    :param header: (服务器信息行, 虚拟机信息行, [源文件大小, 修改时间])
+    :param days: [(ops, types, ids)]
     :return: 无
     """
-    global OP_LIST
-    vm_type = kwargs.get('vm_type')  # 不是add操作则没有vm_type
-    vm_id = kwargs['vm_id']
-    if vm_type:
-        OP_LIST[day + 1].append([op, vm_type.strip(), int(vm_id)])
-    else:
-        OP_LIST[day + 1].append([op, int(vm_id)])
+    server_lines, vm_lines, source = header
+    day_offsets = np.cumsum([0] + [len(day[0]) for day in days])
+    np.savez(cache_path, server_lines=np.array(server_lines), vm_lines=np.array(vm_lines),
+             source=np.array(source, dtype=np.int64), day_offsets=day_offsets,
+             ops=np.concatenate([day[0] for day in days]), types=np.concatenate([day[1] for day in days]),
+             ids=np.concatenate([day[2] for day in days]))
+
+
+def iter_cached_requests(cache):
+    """
+    从.npz缓存逐天产出请求
+    :param cache: np.load得到的缓存
+    :return: 每天产出(ops, types, ids)
+    """
+    day_offsets, ops, types, ids = cache['day_offsets'], cache['ops'], cache['types'], cache['ids']
+    for day in range(len(day_offsets) - 1):
+        begin, end = day_offsets[day], day_offsets[day + 1]
+        yield ops[begin:end], types[begin:end], ids[begin:end]
 
 
-SURVIVAL_VM = dict()  # 存活虚拟机字典{虚拟机ID:虚拟机种类}
-def add_vm_operation(vm_type: str, vm_id: int):
+def load_trace(path: str, use_cache: bool = None):
+    """
+    读取训练数据：服务器和虚拟机信息立即读取，请求按天流式产出
+    :param path: 训练数据路径
+    :param use_cache: 是否使用.npz缓存，默认USE_TRACE_CACHE
+    :return: 每天请求的生成器
+    """
+    global TOTAL_DAYS
+    use_cache = USE_TRACE_CACHE if use_cache is None else use_cache
+    stat = os.stat(path)
+    source = [stat.st_size, stat.st_mtime_ns]
+    cache_path = path + '.npz'
+    if use_cache and os.path.exists(cache_path):
+        cache = np.load(cache_path)
+        if cache['source'].tolist() == source:
+            build_catalog(cache['server_lines'].tolist(), cache['vm_lines'].tolist())
+            TOTAL_DAYS = len(cache['day_offsets']) - 1
+            return iter_cached_requests(cache)
+    return load_stream(open_trace(path), cache_path if use_cache else None, source)
+
+
+def load_stream(reader, cache_path=None, source=None):
+    """
+    从已打开的输入(mmap/二进制文件/sys.stdin.buffer)读取：服务器和虚拟机信息立即读取，请求按天流式产出
+    :param reader: 支持readline的二进制输入
+    :param cache_path: 不为空时在读完后写入.npz缓存
+    :param source: 写缓存用的[源文件大小, 修改时间]
+    :return: 每天请求的生成器
+    """
+    global TOTAL_DAYS, VISIBLE_DAYS
+    server_lines, vm_lines = read_catalog(reader)
+    days = reader.readline().split()  # ("T" 或交互输入的 "T K")
+    TOTAL_DAYS, VISIBLE_DAYS = int(days[0]), int(days[1]) if len(days) > 1 else 0
+    return iter_requests(reader, TOTAL_DAYS, cache_path, (server_lines, vm_lines, source))
+
+
+class DayReader(threading.Thread):
+    """
+    后台读取线程：逐天读取、解析请求放入有界队列，主线程分配第k天时同时读取第k+1天；
+    队列长度有限，预读的请求最多READ_AHEAD_DAYS天，交互输入时没给出的天在这个线程里等待
+    """
+    def __init__(self, requests, read_ahead: int):
+        """
+        :param requests: 每天请求(ops, types, ids)的生成器
+        :param read_ahead: 队列长度
+        """
+        super().__init__(daemon=True)
+        self.requests = requests
+        self.queue = queue.Queue(read_ahead)
+        self.error = None  # 读取线程中的异常，在主线程重新抛出
+
+    def run(self):
+        try:
+            for requests in self.requests:
+                self.queue.put(requests)
+        except Exception as error:
+            self.error = error
+        self.queue.put(None)
+
+    def __iter__(self):
+        self.start()
+        while True:
+            requests = self.queue.get()
+            if requests is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield requests
+
+
+class Lookahead:
+    """
+    前瞻窗口：包装每天请求的生成器，产出当天请求时已预读之后K天的请求，
+    维护窗口内add请求的CPU、内存总需求，以及 虚拟机ID -> 删除日 的索引(只保存窗口内的del)
+    """
+    def __init__(self, requests, days: int):
+        """
+        :param requests: 每天请求(ops, types, ids)的可迭代对象
+        :param days: 前瞻天数K
+        """
+        self.requests = iter(requests)
+        self.days = days
+        self.day = 0  # 当前天(从1开始)
+        self.window = deque()  # [((ops, types, ids), add的CPU, add的内存, del的虚拟机ID)]，产出当天后只剩之后K天
+        self.delete_day = dict()  # {虚拟机ID:删除日}
+        self.pending_cpu = self.pending_memory = 0  # 窗口内add请求的总需求
+
+    def __iter__(self):
+        while True:
+            while len(self.window) <= self.days and self._push():  # 当天+之后K天
+                pass
+            if not self.window:
+                return
+            requests, cpu_size, memory_size, del_ids = self.window.popleft()
+            self.day += 1
+            self.pending_cpu -= cpu_size
+            self.pending_memory -= memory_size
+            yield requests
+            for vm_id in del_ids:  # 当天的del已经执行
+                self.delete_day.pop(vm_id, None)
+
+    def _push(self) -> bool:
+        """
+        预读一天请求加入窗口
+        :return: 是否还有请求
+        """
+        requests = next(self.requests, None)
+        if requests is None:
+            return False
+        ops, types, ids = requests
+        adds = types[ops == OP_ADD]
+        cpu_size = int(VM_CATALOG.vec('cpu')[adds].sum())
+        memory_size = int(VM_CATALOG.vec('memory')[adds].sum())
+        del_ids = ids[ops == OP_DEL].tolist()
+        self.delete_day.update(dict.fromkeys(del_ids, self.day + len(self.window) + 1))
+        self.pending_cpu += cpu_size
+        self.pending_memory += memory_size
+        self.window.append((requests, cpu_size, memory_size, del_ids))
+        return True
+
+    def lifetime(self, vm_id: int) -> int:
+        """
+        虚拟机从当天起还要运行的天数(删除当天不计能耗)，窗口内没有删除时按运行到最后一天计算
+        :param vm_id: 虚拟机ID
+        :return: 天数
+        """
+        return self.delete_day.get(vm_id, TOTAL_DAYS + 1) - self.day
+
+
+LOOKAHEAD = Lookahead([], 0)  # 当前的前瞻窗口
+
+
+class Cluster:
+    """
+    集群状态的撤销日志：打开保存点后，购买、放置、回收、虚拟机增删都记录逆操作，
+    回滚时倒序执行，耗时与保存点之后的改动量成正比，与集群规模无关；
+    同时维护存活虚拟机需要的CPU、内存总数
+    """
+    def __init__(self):
+        self.need_cpu = self.need_memory = 0  # 存活虚拟机需要的CPU和内存总数
+        self.undo_log = []  # [(操作, 参数...)]
+        self.depth = 0  # 打开的保存点层数，为0时不记录
+        self.rollbacks = 0  # 回滚次数
+
+    def savepoint(self) -> int:
+        """
+        打开保存点（可以嵌套）
+        :return: 保存点位置
+        """
+        self.depth += 1
+        return len(self.undo_log)
+
+    def release(self, savepoint: int):
+        """
+        保留保存点之后的改动；外层还有保存点时日志留给外层回滚
+        :param savepoint: savepoint()的返回值
+        :return: 无
+        """
+        self.depth -= 1
+        if not self.depth:
+            self.undo_log.clear()
+
+    def rollback(self, savepoint: int):
+        """
+        撤销保存点之后的全部改动
+        :param savepoint: savepoint()的返回值
+        :return: 无
+        """
+        log, depth, self.depth = self.undo_log, self.depth, 0  # 逆操作本身不再记录
+        self.rollbacks += 1
+        while len(log) > savepoint:
+            entry = log.pop()
+            if entry[0] == 'allocate':
+                release_vm(entry[1])
+            elif entry[0] == 'release':
+                allocate_vm(entry[2], *entry[1][:3], entry[3])
+            elif entry[0] == 'purchase':
+                unregister_server(entry[1])
+            elif entry[0] == 'add':
+                del_vm_operation(entry[1])
+            else:
+                add_vm_operation(entry[2], entry[1])
+        self.depth = depth - 1
+
+
+CLUSTER = Cluster()  # 集群状态的撤销日志
+
+
+SURVIVAL_VM = dict()  # 存活虚拟机字典{虚拟机ID:虚拟机种类下标}
+def add_vm_operation(vm_type: int, vm_id: int):
     """
     增加虚拟机操作
-    :param vm_type: 虚拟机种类名
+    :param vm_type: 虚拟机种类下标
     :param vm_id: 虚拟机ID
     :return: 无
     """
     SURVIVAL_VM[int(vm_id)] = vm_type
+    CLUSTER.need_cpu += VM_CATALOG.cpu[vm_type]
+    CLUSTER.need_memory += VM_CATALOG.memory[vm_type]
+    if CLUSTER.depth:
+        CLUSTER.undo_log.append(('add', int(vm_id)))
 
 
-def del_vm_operation(vm_id):
+VM_LOCATION = dict()  # 虚拟机位置字典{虚拟机ID:(ServerRecord, 'A'/'B'/'AB')}，跨天保存，del时直接定位
+def record_vm_location(vm_id: int, obj, node: str):
     """
-    删除虚拟机操作
+    记录虚拟机挂载的服务器和结点
     :param vm_id: 虚拟机ID
+    :param obj: ServerRecord
+    :param node: 'A'、'B'或双节点'AB'
     :return: 无
     """
-    SURVIVAL_VM.pop(int(vm_id))
+    VM_LOCATION[vm_id] = (obj, node)
+    SERVERS_BY_VM_COUNT[len(obj.vim_id)].pop(obj, None)
+    if not obj.vim_id:
+        LEDGER.on_power(obj, 1)  # 空服务器开机
+    obj.vim_id[vm_id] = 1 if node == 'AB' else 0
+    SERVERS_BY_VM_COUNT[len(obj.vim_id)][obj] = None
 
 
-need_cpu = need_memory = 0  # 每天请求需要的CPU和内存数
-def calculate_capacity(day: int, OP_LIST: dict, VM_INFO: dict, SURVIVAL_VM: dict) -> (int,int):
-    global need_cpu, need_memory
-    yesterday_req = OP_LIST[day]
-    for req in yesterday_req:
-        if req[0] == 'add':
-            add_vm_operation(req[1], req[2])
-            need_cpu += VM_INFO[req[1]]['vm_cpu_cores']
-            need_memory += VM_INFO[req[1]]['vm_memory_size']
-        elif req[0] == 'del':
-            need_cpu -= VM_INFO[SURVIVAL_VM[req[1]]]['vm_cpu_cores']
-            need_memory -= VM_INFO[SURVIVAL_VM[req[1]]]['vm_memory_size']
-            del_vm_operation(req[1])
-    return need_cpu, need_memory
+SERVERS_BY_VM_COUNT = defaultdict(dict)  # {挂载的虚拟机数:{ServerRecord:None}}，迁移时直接取虚拟机最少的服务器
+def release_vm(del_vim_infos):
+    """
+    从挂载的服务器上移除虚拟机并回收资源
+    :param del_vim_infos: [vim_id, cpu, memory, 单/双节点]
+    :return: (ServerRecord, 'A'/'B'/'AB')
+    """
+    obj, node = VM_LOCATION.pop(del_vim_infos[0])
+    SERVERS_BY_VM_COUNT[len(obj.vim_id)].pop(obj, None)
+    del obj.vim_id[del_vim_infos[0]]  # 删除挂载的节点
+    SERVERS_BY_VM_COUNT[len(obj.vim_id)][obj] = None
+    if not obj.vim_id:
+        LEDGER.on_power(obj, -1)  # 服务器空了，不再产生能耗成本
+    dynamic_recycle_server(obj, del_vim_infos, node)  # 更新当前服务器的资源
+    LEDGER.on_usage(node, -del_vim_infos[1], -del_vim_infos[2])
+    if CLUSTER.depth:
+        CLUSTER.undo_log.append(('release', del_vim_infos, obj, node))
+    return obj, node
 
 
-def sort_performance(SERVER_INFO:dict) -> list:
+def del_vm_operation(vm_id):
     """
-    根据综合性价比排序
-    :param SERVER_INFO: 服务器信息字典
-    :return: com_per_list排好的列表
+    删除虚拟机操作
+    :param vm_id: 虚拟机ID
+    :return: 无
+    """
+    vm_type = SURVIVAL_VM.pop(int(vm_id))
+    CLUSTER.need_cpu -= VM_CATALOG.cpu[vm_type]
+    CLUSTER.need_memory -= VM_CATALOG.memory[vm_type]
+    if CLUSTER.depth:
+        CLUSTER.undo_log.append(('del', int(vm_id), vm_type))
+
+
+def sort_performance(server_catalog: ServerCatalog) -> ServerCatalog:
+    """
+    根据综合性价比排序（按当前的A_CPU/A_MEM/B_CPU/B_MEM重新计算综合性价比）
+    :param server_catalog: 服务器种类表
+    :return: 按综合性价比重新编号的服务器种类表
     """
-    # com_per_list = sorted(SERVER_INFO.items(), key=lambda s: s[1]['com_per'])
-    server_info = sorted(SERVER_INFO.items(), key=lambda s: s[1]['com_per'])
-    return server_info
+    return ServerCatalog(sorted((generate_server(*row[:5]) for row in server_catalog.rows()), key=lambda s: s[5]))
 
 class ServerRecord:
     """
-    记录分配的服务器信息
+    记录分配的服务器信息，A、B结点的剩余资源保存在FLEET的第no行
     """
+    __slots__ = ('server_name', 'running_state', 'num', 'no', 'server_no', 'server_id', 'vim_id')
+
     def __init__(self):
         self.server_name = None
-        self.running_state = True
+        self.running_state = True  # False表示正在迁出，不接收新的虚拟机
         self.num = 0
-        self.a = None
-        self.b = None
+        self.no = None  # 在FLEET和DSITRIBUTE_SERVER_LIST中的下标，作为容量索引的键
+        self.server_no = None  # 服务器种类下标
+        self.server_id = None  # 输出给判题器的服务器ID（按每天购买输出的顺序编号）
         self.vim_id = {}
 
-def get_per_vim_infos(vim_name):
+    @property
+    def a(self):
+        """
+        :return: A结点剩余的(CPU, 内存)
+        """
+        return FLEET.a_cpu[self.no], FLEET.a_memory[self.no]
+
+    @a.setter
+    def a(self, value):
+        FLEET.a_cpu[self.no], FLEET.a_memory[self.no] = value
+
+    @property
+    def b(self):
+        """
+        :return: B结点剩余的(CPU, 内存)
+        """
+        return FLEET.b_cpu[self.no], FLEET.b_memory[self.no]
+
+    @b.setter
+    def b(self, value):
+        FLEET.b_cpu[self.no], FLEET.b_memory[self.no] = value
+
+
+class FleetStore:
     """
-    获取vim的信息
+    服务器结点剩余资源的列存：每台服务器一行(下标即ServerRecord.no)，A结点CPU、A结点内存、B结点CPU、B结点内存
+    四列是预分配的int64数组(array.array)，放置和回收时原地加减，不再每次新建元组；
+    容量不够时成倍扩容，vec()返回共享内存的numpy视图（扩容后需要重新获取）
     """
-    return VM_INFO[vim_name]["vm_cpu_cores"],\
-           VM_INFO[vim_name]["vm_memory_size"],\
-           VM_INFO[vim_name]["single_or_double"]
+    COLUMNS = ('a_cpu', 'a_memory', 'b_cpu', 'b_memory')
+
+    def __init__(self, capacity=1024):
+        self.size = 0  # 已使用的行数
+        self.capacity = capacity
+        self.a_cpu, self.a_memory, self.b_cpu, self.b_memory = (array('q', bytes(8 * capacity)) for _ in self.COLUMNS)
+        self._vec = {}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        """
+        容量翻倍：新建数组复制原数据（旧数组可能正被numpy视图引用，不能原地扩容）
+        :return: 无
+        """
+        for column in self.COLUMNS:
+            values = array('q', getattr(self, column))
+            values.frombytes(bytes(8 * self.capacity))
+            setattr(self, column, values)
+        self.capacity *= 2
+        self._vec.clear()
+
+    def append(self, a, b) -> int:
+        """
+        新增一行
+        :param a: A结点剩余的(CPU, 内存)
+        :param b: B结点剩余的(CPU, 内存)
+        :return: 行下标
+        """
+        if self.size == self.capacity:
+            self._grow()
+        no = self.size
+        self.a_cpu[no], self.a_memory[no] = a
+        self.b_cpu[no], self.b_memory[no] = b
+        self.size += 1
+        return no
+
+    def pop(self):
+        """
+        删除最后一行
+        :return: 无
+        """
+        self.size -= 1
+
+    def vec(self, column: str) -> np.ndarray:
+        """
+        :param column: 列名
+        :return: 已使用的行对应的numpy视图(int64)
+        """
+        values = self._vec.get(column)
+        if values is None:
+            values = self._vec[column] = np.frombuffer(getattr(self, column), dtype=np.int64)
+        return values[:self.size]
+
+
+FLEET = FleetStore()  # 已购买服务器结点的剩余资源
 
-def check_can_allocate(server_no,cpu_size,memory_size):
+
+class FirstFitIndex:
     """
-    检测此服务器是否满足分配
+    首次适应容量索引：按键(购买顺序)建立线段树，结点记录子树内的最大剩余CPU和内存，
+    查询键最小的、能放下(cpu, memory)的条目
     """
-    # print(SERVER_INFO[server_no][1]["server_cpu_memory_a"][0],cpu_size)
+    def __init__(self, capacity=1024):
+        self.size = 1
+        while self.size < capacity:
+            self.size <<= 1
+        self.cpu = [-1] * (2 * self.size)
+        self.memory = [-1] * (2 * self.size)
+        self.finds = self.scanned = self.misses = 0  # 查询次数、访问的线段树结点数、查不到的次数
 
-    # 刚开始分配只需检测一个结点满足即可
-    if SERVER_INFO[server_no][1]["server_cpu_memory_a"][0] >= cpu_size and SERVER_INFO[server_no][1]["server_cpu_memory_a"][1] >= memory_size:
-        return True
-    else:
-        return False
+    def _grow(self, key):
+        """
+        键超出线段树容量时成倍扩容并重建
+        :param key: 待写入的键
+        :return: 无
+        """
+        size = self.size
+        while size <= key:
+            size <<= 1
+        cpu, memory = [-1] * (2 * size), [-1] * (2 * size)
+        cpu[size:size + self.size] = self.cpu[self.size:]
+        memory[size:size + self.size] = self.memory[self.size:]
+        for i in range(size - 1, 0, -1):
+            cpu[i] = max(cpu[2 * i], cpu[2 * i + 1])
+            memory[i] = max(memory[2 * i], memory[2 * i + 1])
+        self.size, self.cpu, self.memory = size, cpu, memory
+
+    def update(self, key, cpu_size, memory_size):
+        """
+        写入/更新条目的剩余资源
+        :param key: 条目键
+        :param cpu_size: 剩余CPU
+        :param memory_size: 剩余内存
+        :return: 无
+        """
+        if key >= self.size:
+            self._grow(key)
+        cpu, memory = self.cpu, self.memory
+        i = key + self.size
+        cpu[i], memory[i] = cpu_size, memory_size
+        i >>= 1
+        while i:
+            cpu[i] = max(cpu[2 * i], cpu[2 * i + 1])
+            memory[i] = max(memory[2 * i], memory[2 * i + 1])
+            i >>= 1
+
+    def remove(self, key):
+        """
+        移除条目
+        :param key: 条目键
+        :return: 无
+        """
+        if key < self.size:
+            self.update(key, -1, -1)
+
+    def find(self, cpu_size, memory_size):
+        """
+        查找键最小的可分配条目
+        :param cpu_size: 需要的CPU
+        :param memory_size: 需要的内存
+        :return: 条目键，没有则返回-1
+        """
+        cpu, memory, size = self.cpu, self.memory, self.size
+        stack, visited = [1], 0
+        self.finds += 1
+        while stack:
+            i = stack.pop()
+            visited += 1
+            if cpu[i] < cpu_size or memory[i] < memory_size:
+                continue
+            if i >= size:
+                self.scanned += visited
+                return i - size
+            stack.append(2 * i + 1)
+            stack.append(2 * i)
+        self.scanned += visited
+        self.misses += 1
+        return -1
+
+
+class BestFitIndex:
+    """
+    最佳适应容量索引：按剩余CPU建立线段树（叶子记录该CPU值下的最大剩余内存），
+    每个CPU值对应一个按剩余内存排序的桶，查询能放下(cpu, memory)的最小(CPU, 内存)条目
+    """
+    def __init__(self, max_cpu):
+        self.size = 1
+        while self.size <= max_cpu:
+            self.size <<= 1
+        self.tree = [-1] * (2 * self.size)
+        self.buckets = defaultdict(list)  # {剩余CPU:[(剩余内存, 键)]}
+        self.where = {}  # {键:(剩余CPU, 剩余内存)}
+        self.finds = self.scanned = self.misses = 0  # 查询次数、访问的线段树结点数、查不到的次数
+
+    def _refresh(self, cpu_size):
+        """
+        重新计算某个CPU值的叶子并向上更新
+        :param cpu_size: 剩余CPU值
+        :return: 无
+        """
+        tree, bucket = self.tree, self.buckets[cpu_size]
+        i = cpu_size + self.size
+        tree[i] = bucket[-1][0] if bucket else -1
+        i >>= 1
+        while i:
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+            i >>= 1
+
+    def update(self, key, cpu_size, memory_size):
+        """
+        写入/更新条目的剩余资源
+        :param key: 条目键
+        :param cpu_size: 剩余CPU
+        :param memory_size: 剩余内存
+        :return: 无
+        """
+        cpu_size, memory_size = int(cpu_size), int(memory_size)
+        if self.where.get(key) == (cpu_size, memory_size):
+            return
+        self.remove(key)
+        if cpu_size < 0 or memory_size < 0:
+            return
+        bisect.insort(self.buckets[cpu_size], (memory_size, key))
+        self.where[key] = (cpu_size, memory_size)
+        self._refresh(cpu_size)
+
+    def remove(self, key):
+        """
+        移除条目
+        :param key: 条目键
+        :return: 无
+        """
+        old = self.where.pop(key, None)
+        if old is None:
+            return
+        bucket = self.buckets[old[0]]
+        bucket.pop(bisect.bisect_left(bucket, (old[1], key)))
+        self._refresh(old[0])
+
+    def find(self, cpu_size, memory_size):
+        """
+        查找剩余资源最小的可分配条目
+        :param cpu_size: 需要的CPU
+        :param memory_size: 需要的内存
+        :return: 条目键，没有则返回-1
+        """
+        tree, size = self.tree, self.size
+        i = int(cpu_size) + size
+        self.finds += 1
+        if i >= 2 * size:
+            self.misses += 1
+            return -1
+        # 找到下标>=cpu_size且最大剩余内存>=memory_size的最左叶子
+        visited = 0
+        while True:
+            while not i & 1:
+                i >>= 1
+            visited += 1
+            if tree[i] >= memory_size:
+                while i < size:
+                    i <<= 1
+                    visited += 1
+                    if tree[i] < memory_size:
+                        i += 1
+                break
+            i += 1
+            if i & -i == i:
+                self.scanned += visited
+                self.misses += 1
+                return -1
+        self.scanned += visited
+        bucket = self.buckets[i - size]
+        return bucket[bisect.bisect_left(bucket, (memory_size, -1))][1]
+
+
+def tightest_fit(cpu_left, memory_left):
+    """
+    最紧适应：放置后剩余资源越少越好
+    :param cpu_left: 放置后剩余CPU占最大结点CPU的比例(数组)
+    :param memory_left: 放置后剩余内存占最大结点内存的比例(数组)
+    :return: 打分数组，越小越好
+    """
+    return cpu_left + memory_left
+
+
+def balanced_fit(cpu_left, memory_left):
+    """
+    主导资源均衡：放置后剩余CPU、内存的比例越接近越好，避免只剩一种资源的碎片
+    :param cpu_left: 放置后剩余CPU占最大结点CPU的比例(数组)
+    :param memory_left: 放置后剩余内存占最大结点内存的比例(数组)
+    :return: 打分数组，越小越好
+    """
+    return np.abs(cpu_left - memory_left)
+
+
+FIT_SCORES = {'tightest': tightest_fit, 'balance': balanced_fit}  # 'vector'放置的候选打分函数
+
+
+class VectorIndex:
+    """
+    向量化可行性扫描：不另外维护索引结构，查询时对FLEET的四列做一次numpy比较，得到所有服务器
+    单结点(键为 服务器下标*2+结点，A、B交替)或双结点(键为服务器下标，A、B取较小者)的可放置掩码，
+    再按FIT_SCORES中的打分选出最优候选；同形状的多个虚拟机可以用find_many一次查询
+    """
+    def __init__(self, double, score=None):
+        """
+        :param double: 是否为双结点索引
+        :param score: FIT_SCORES中的打分名，默认FIT_SCORE
+        """
+        self.double = double
+        self.score = FIT_SCORES[score or FIT_SCORE]
+        self.max_cpu, self.max_memory = max(SERVER_CATALOG.node_cpu), max(SERVER_CATALOG.node_memory)
+        self.removed = set()  # 不参与放置的键（正在迁出的服务器）
+        self.finds = self.scanned = self.misses = 0  # 查询次数、比较的条目数、查不到的次数
+
+    def update(self, key, cpu_size, memory_size):
+        """
+        剩余资源直接从FLEET读取，这里只恢复被移除的条目
+        """
+        self.removed.discard(key)
+
+    def remove(self, key):
+        """
+        移除条目
+        :param key: 条目键
+        :return: 无
+        """
+        self.removed.add(key)
+
+    def _candidates(self, cpu_size, memory_size):
+        """
+        一次向量化比较得到全部可放置的条目
+        :return: (候选键数组, 候选的剩余CPU, 候选的剩余内存)
+        """
+        if self.double:
+            cpu = np.minimum(FLEET.vec('a_cpu'), FLEET.vec('b_cpu'))
+            memory = np.minimum(FLEET.vec('a_memory'), FLEET.vec('b_memory'))
+        else:
+            cpu = np.stack((FLEET.vec('a_cpu'), FLEET.vec('b_cpu')), axis=1).ravel()
+            memory = np.stack((FLEET.vec('a_memory'), FLEET.vec('b_memory')), axis=1).ravel()
+        mask = (cpu >= cpu_size) & (memory >= memory_size)
+        self.finds += 1
+        self.scanned += len(mask)
+        if self.removed:
+            mask[[key for key in self.removed if key < len(mask)]] = False
+        keys = np.flatnonzero(mask)
+        return keys, cpu[keys], memory[keys]
+
+    def find(self, cpu_size, memory_size):
+        """
+        查找打分最好的可分配条目
+        :param cpu_size: 需要的CPU
+        :param memory_size: 需要的内存
+        :return: 条目键，没有则返回-1
+        """
+        keys, cpu, memory = self._candidates(cpu_size, memory_size)
+        if not len(keys):
+            self.misses += 1
+            return -1
+        scores = self.score((cpu - cpu_size) / self.max_cpu, (memory - memory_size) / self.max_memory)
+        return int(keys[scores.argmin()])
+
+    def find_many(self, cpu_size, memory_size, count):
+        """
+        同形状的count个虚拟机一次查询：每个候选按能放下的个数展开，按打分从好到差取前count个
+        :param cpu_size: 每个虚拟机需要的CPU
+        :param memory_size: 每个虚拟机需要的内存
+        :param count: 虚拟机个数
+        :return: 条目键列表（同一个键可以出现多次），放不下的部分不返回
+        """
+        keys, cpu, memory = self._candidates(cpu_size, memory_size)
+        if not len(keys):
+            return []
+        slots = np.minimum(cpu // max(cpu_size, 1), memory // max(memory_size, 1))
+        order = np.argsort(self.score((cpu - cpu_size) / self.max_cpu, (memory - memory_size) / self.max_memory),
+                           kind='stable')
+        return np.repeat(keys[order], np.minimum(slots[order], count))[:count].tolist()
+
+
+class CostLedger:
+    """
+    增量成本核算：购买、开关机、放置、回收时O(1)更新，每天结束时追加一行时间序列，不需要每天重新扫描所有服务器
+    """
+    COLUMNS = ('day', 'servers', 'powered', 'hardware_cost', 'daily_power_cost', 'total_cost')
+    UTILIZATION = ('cpu_a', 'memory_a', 'cpu_b', 'memory_b')  # 已开机服务器A、B结点的CPU、内存利用率
+
+    def __init__(self):
+        self.servers = 0  # 已购买的服务器数
+        self.powered = 0  # 已开机(挂载了虚拟机)的服务器数
+        self.hardware_cost = 0  # 累计硬件成本
+        self.power_cost = 0  # 累计能耗成本
+        self.powered_power_cost = 0  # 已开机服务器每天的能耗成本
+        self.capacity = [0, 0]  # 已开机服务器单个结点的CPU、内存之和（A、B结点相同）
+        self.used = [0, 0, 0, 0]  # A结点CPU、A结点内存、B结点CPU、B结点内存的使用量
+        self.series = {column: array('q') for column in self.COLUMNS}
+        self.series.update((column, array('d')) for column in self.UTILIZATION)
+
+    def on_purchase(self, obj, sign=1):
+        """
+        购买服务器(1)或撤销购买(-1)
+        :param obj: ServerRecord
+        :param sign: 1 or -1
+        :return: 无
+        """
+        self.servers += sign
+        self.hardware_cost += sign * SERVER_CATALOG.server_cost[obj.server_no]
+
+    def on_power(self, obj, sign):
+        """
+        服务器开机(1)或关机(-1)：挂上第一台虚拟机/最后一台虚拟机被移走
+        :param obj: ServerRecord
+        :param sign: 1 or -1
+        :return: 无
+        """
+        self.powered += sign
+        self.powered_power_cost += sign * SERVER_CATALOG.power_cost[obj.server_no]
+        self.capacity[0] += sign * SERVER_CATALOG.node_cpu[obj.server_no]
+        self.capacity[1] += sign * SERVER_CATALOG.node_memory[obj.server_no]
+
+    def on_usage(self, node, cpu_size, memory_size):
+        """
+        结点资源使用量变化（回收时为负数）
+        :param node: 'A'、'B'或'AB'(A、B各一半)
+        :param cpu_size: 虚拟机CPU核数
+        :param memory_size: 虚拟机内存大小
+        :return: 无
+        """
+        used = self.used
+        if node == "AB":
+            cpu_size, memory_size = cpu_size // 2, memory_size // 2
+            used[0] += cpu_size
+            used[1] += memory_size
+            used[2] += cpu_size
+            used[3] += memory_size
+        elif node == "A":
+            used[0] += cpu_size
+            used[1] += memory_size
+        else:
+            used[2] += cpu_size
+            used[3] += memory_size
+
+    def utilization(self):
+        """
+        :return: 已开机服务器 (A CPU, A内存, B CPU, B内存) 利用率
+        """
+        cpu, memory = self.capacity
+        if not cpu:
+            return 0.0, 0.0, 0.0, 0.0
+        return self.used[0] / cpu, self.used[1] / memory, self.used[2] / cpu, self.used[3] / memory
+
+    def close_day(self, day):
+        """
+        一天结束：累加当天已开机服务器的能耗成本，追加一行时间序列
+        :param day: 第day天
+        :return: 无
+        """
+        self.power_cost += self.powered_power_cost
+        row = (day, self.servers, self.powered, self.hardware_cost, self.powered_power_cost,
+               self.hardware_cost + self.power_cost)
+        for column, value in zip(self.COLUMNS, row):
+            self.series[column].append(value)
+        for column, value in zip(self.UTILIZATION, self.utilization()):
+            self.series[column].append(value)
+
+    def as_dict(self):
+        """
+        :return: {列名:[每天的值]}，便于导出JSON
+        """
+        return {column: values.tolist() for column, values in self.series.items()}
+
+
+LEDGER = CostLedger()  # 成本核算
+
+
+INDEX_POLICY = None  # 当前容量索引对应的放置策略
+NODE_INDEX = None  # 单结点容量索引，键为 服务器下标*2+结点(A:0,B:1)
+DOUBLE_INDEX = None  # 双结点容量索引，键为服务器下标，值为A、B结点剩余资源的较小者
+
+
+def make_capacity_index(policy, max_cpu, double=False):
+    """
+    按放置策略创建容量索引
+    :param policy: 'first_fit' or 'best_fit' or 'vector'('auto'在集群较小时也用它)
+    :param max_cpu: 单个结点的最大CPU数
+    :param double: 是否为双结点索引
+    :return: 容量索引
+    """
+    if policy == 'first_fit':
+        return FirstFitIndex()
+    elif policy == 'best_fit':
+        return BestFitIndex(max_cpu)
+    elif policy == 'vector':
+        return VectorIndex(double)
+    raise ValueError("未知的放置策略：%s" % policy)
+
+
+def init_capacity_index(policy=None):
+    """
+    初始化单/双结点容量索引
+    :param policy: 放置策略，默认使用PLACEMENT_POLICY
+    :return: 无
+    """
+    global NODE_INDEX, DOUBLE_INDEX, INDEX_POLICY
+    INDEX_POLICY = policy or PLACEMENT_POLICY
+    index_policy = 'vector' if INDEX_POLICY == 'auto' else INDEX_POLICY
+    max_cpu = max(SERVER_CATALOG.node_cpu)
+    NODE_INDEX = make_capacity_index(index_policy, max_cpu)
+    DOUBLE_INDEX = make_capacity_index(index_policy, max_cpu, True)
+
+
+def switch_capacity_index(policy):
+    """
+    换用另一种容量索引，已购买的服务器全部重新加入，查询统计累加到新索引
+    :param policy: 新的放置策略
+    :return: 无
+    """
+    old_indexes = NODE_INDEX, DOUBLE_INDEX
+    init_capacity_index(policy)
+    for old, new in zip(old_indexes, (NODE_INDEX, DOUBLE_INDEX)):
+        new.finds, new.scanned, new.misses = old.finds, old.scanned, old.misses
+    for obj in DSITRIBUTE_SERVER_LIST:
+        refresh_server_index(obj)
+
+
+def refresh_server_index(obj):
+    """
+    服务器剩余资源变化后同步到容量索引
+    :param obj: ServerRecord
+    :return: 无
+    """
+    if not obj.running_state:  # 正在迁出的服务器不参与放置
+        NODE_INDEX.remove(obj.no * 2)
+        NODE_INDEX.remove(obj.no * 2 + 1)
+        DOUBLE_INDEX.remove(obj.no)
+        return
+    no = obj.no
+    a_cpu, a_memory, b_cpu, b_memory = FLEET.a_cpu[no], FLEET.a_memory[no], FLEET.b_cpu[no], FLEET.b_memory[no]
+    NODE_INDEX.update(no * 2, a_cpu, a_memory)
+    NODE_INDEX.update(no * 2 + 1, b_cpu, b_memory)
+    DOUBLE_INDEX.update(no, min(a_cpu, b_cpu), min(a_memory, b_memory))
+
+
+def register_server(server):
+    """
+    记录新购买的服务器并加入容量索引
+    :param server: ServerRecord
+    :return: 无
+    """
+    DSITRIBUTE_SERVER_LIST.append(server)  # server.no在dynamic_allocate_server中分配，两者下标一致
+    NEW_SERVERS.append(server)
+    LEDGER.on_purchase(server)
+    refresh_server_index(server)
+    if INDEX_POLICY == 'auto' and len(DSITRIBUTE_SERVER_LIST) > VECTOR_MAX_SERVERS:
+        switch_capacity_index('best_fit')  # 集群变大后换成线段树，之后不再换回
+    SERVERS_BY_VM_COUNT[len(server.vim_id)][server] = None
+    if CLUSTER.depth:
+        CLUSTER.undo_log.append(('purchase', server))
+
+
+def unregister_server(server):
+    """
+    撤销最后一次购买（服务器上已经没有虚拟机）
+    :param server: ServerRecord，必须是最后购买的服务器
+    :return: 无
+    """
+    DSITRIBUTE_SERVER_LIST.pop()
+    FLEET.pop()
+    NEW_SERVERS.remove(server)
+    LEDGER.on_purchase(server, -1)
+    NODE_INDEX.remove(server.no * 2)
+    NODE_INDEX.remove(server.no * 2 + 1)
+    DOUBLE_INDEX.remove(server.no)
+    SERVERS_BY_VM_COUNT[0].pop(server, None)
+
+def get_per_vim_infos(vm_no):
+    """
+    获取vim的信息
+    :param vm_no: 虚拟机种类下标
+    :return: (CPU核数, 内存大小, 单/双节点)
+    """
+    return SHAPES.vm_infos[vm_no]
+
+
+def fit_table() -> np.ndarray:
+    """
+    当前服务器种类顺序下的(虚拟机形状 x 服务器种类)可行性表，第一次使用时从SHAPES换列得到
+    :return: bool数组，fit_table()[形状编号]是每种服务器能否放下
+    """
+    if SERVER_CATALOG.fit is None:
+        SERVER_CATALOG.fit = SHAPES.fit_table(SERVER_CATALOG)
+    return SERVER_CATALOG.fit
 
 def dynamic_allocate_server(server_no,used_cpu,used_memory,single_or_double):
     """
-    分配服务器资源
+    分配服务器资源：在FLEET中新增一行作为这台服务器的结点剩余资源，之后应立即register_server
     """
     server = ServerRecord()
-    server.server_name = SERVER_INFO[server_no][0]
+    server.server_name = SERVER_CATALOG.names[server_no]
+    server.server_no = server_no
     server.num = 1
-    # print("当前服务器规格")
-    # print(SERVER_INFO[server_no][0],SERVER_INFO[server_no][1]["server_cpu_memory_a"],SERVER_INFO[server_no][1]["server_cpu_memory_b"])
+    node_cpu, node_memory = SERVER_CATALOG.node_cpu[server_no], SERVER_CATALOG.node_memory[server_no]
     if single_or_double:
-        server.a = (SERVER_INFO[server_no][1]["server_cpu_memory_a"][0]-used_cpu,
-                    SERVER_INFO[server_no][1]["server_cpu_memory_a"][1]-used_memory)
-        server.b = (SERVER_INFO[server_no][1]["server_cpu_memory_b"][0]-used_cpu,
-                    SERVER_INFO[server_no][1]["server_cpu_memory_b"][1]-used_memory)
+        server.no = FLEET.append((node_cpu - used_cpu, node_memory - used_memory),
+                                 (node_cpu - used_cpu, node_memory - used_memory))
     else:
-        server.a = (SERVER_INFO[server_no][1]["server_cpu_memory_a"][0] - used_cpu,
-                    SERVER_INFO[server_no][1]["server_cpu_memory_a"][1] - used_memory)
-        server.b = (SERVER_INFO[server_no][1]["server_cpu_memory_b"][0],
-                    SERVER_INFO[server_no][1]["server_cpu_memory_b"][1])
+        server.no = FLEET.append((node_cpu - used_cpu, node_memory - used_memory), (node_cpu, node_memory))
     # server.vim_id[vim_id] = single_or_double
     # print("处理后",used_cpu,used_memory,server.a,server.b)
     return server
 
-def dynamic_recycle_server(obj,del_vim_infos,IS_A_OR_B):
+def dynamic_recycle_server(obj,del_vim_infos,node):
     """
     回收服务器资源
+    :param obj: ServerRecord
+    :param del_vim_infos: [vim_id, cpu, memory, 单/双节点]
+    :param node: 虚拟机所在结点 'A'、'B'或'AB'
     :return:
     """
     recycle_cpu_size  = del_vim_infos[1]
     recycle_memory_size = del_vim_infos[2]
-    print("回收服务器名：", obj.server_name,recycle_cpu_size,recycle_memory_size,del_vim_infos[-1],IS_A_OR_B[del_vim_infos[0]])
-    print(obj.a,obj.b)
+    if LOG_DEBUG:
+        LOGGER.debug("回收服务器名：%s %s %s %s %s %s %s", obj.server_name, recycle_cpu_size, recycle_memory_size,
+                     del_vim_infos[-1], node, obj.a, obj.b)
+    no = obj.no
     # 双节点
     if del_vim_infos[-1]:
         recycle_cpu_size = recycle_cpu_size //2
         recycle_memory_size = recycle_memory_size //2
-        obj.a = (obj.a[0] + recycle_cpu_size,obj.a[1] + recycle_memory_size)
-        obj.b = (obj.b[0] + recycle_cpu_size,obj.b[1] + recycle_memory_size)
+        FLEET.a_cpu[no] += recycle_cpu_size
+        FLEET.a_memory[no] += recycle_memory_size
+        FLEET.b_cpu[no] += recycle_cpu_size
+        FLEET.b_memory[no] += recycle_memory_size
     # 单节点要看是在哪个节点上分配的，分情况
     else:
-        if IS_A_OR_B[del_vim_infos[0]] == "A":
-            obj.a = (obj.a[0] + recycle_cpu_size,obj.a[1] + recycle_memory_size)
+        if node == "A":
+            FLEET.a_cpu[no] += recycle_cpu_size
+            FLEET.a_memory[no] += recycle_memory_size
         else:
-            obj.b = (obj.b[0] + recycle_cpu_size, obj.b[1] + recycle_memory_size)
-    print(obj.a,obj.b)
+            FLEET.b_cpu[no] += recycle_cpu_size
+            FLEET.b_memory[no] += recycle_memory_size
+    refresh_server_index(obj)  # 归还的资源同步到容量索引
 
-def dynamic_record_server_costs(server_no,day):
+def choose_server_type(shape, remain_days):
     """
-    统计当前费用
+    选择购买的服务器种类：能放下虚拟机、且 硬件成本+能耗成本*剩余天数 最小
+    结果按(形状编号, 剩余天数分桶)缓存，同样形状的虚拟机不再重复计算
+    :param shape: 虚拟机形状编号
+    :param remain_days: 剩余天数
+    :return: 服务器种类下标
     """
-    return SERVER_INFO[server_no][1]["server_cost"]\
-           +SERVER_INFO[server_no][1]["power_cost"]*day
+    key = (shape, remain_days // DAYS_BUCKET)
+    server_no = SERVER_CATALOG.purchase_cache.get(key)
+    if server_no is None:
+        server_no = SERVER_CATALOG.cheapest(fit_table()[shape], key[1] * DAYS_BUCKET + DAYS_BUCKET // 2)
+        SERVER_CATALOG.purchase_cache[key] = server_no
+    if server_no < 0:
+        raise ValueError("没有能放下虚拟机%s的服务器" % (SHAPES.shapes[shape],))
+    return server_no
 
-def operator_double_vim(add_request_double,CHOOSE_SERVERS_TYPE,day):
+
+def choose_server_type_ahead(vim_infos, remain_days):
+    """
+    前瞻购买：新服务器还要装下之后K天的add请求，按 总成本/能吸收的(当前虚拟机+窗口内需求)占比 选择，
+    能耗成本按删除日索引得到的虚拟机实际运行天数计算；没有前瞻窗口时同choose_server_type
+    :param vim_infos: [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :param remain_days: 剩余天数
+    :return: 服务器种类下标
+    """
+    vim_id, cpu_size, memory_size, single_or_double, shape = vim_infos
+    if LOOKAHEAD.days == 0:
+        return choose_server_type(shape, remain_days)
+    server_no = SERVER_CATALOG.cheapest_for_demand(fit_table()[shape],
+                                                   cpu_size + LOOKAHEAD.pending_cpu,
+                                                   memory_size + LOOKAHEAD.pending_memory,
+                                                   min(LOOKAHEAD.lifetime(vim_id), remain_days))
+    if server_no < 0:
+        raise ValueError("没有能放下虚拟机(%d, %d)的服务器" % (cpu_size, memory_size))
+    return server_no
+
+
+def find_free_node(cpu_size, memory_size, single_or_double):
+    """
+    通过容量索引在已购买的服务器中查找能放下虚拟机的结点
+    :param cpu_size: 虚拟机CPU核数
+    :param memory_size: 虚拟机内存大小
+    :param single_or_double: 单/双节点
+    :return: (ServerRecord, 'A'/'B'/'AB')，放不下返回(None, None)
+    """
+    if single_or_double:
+        server_no = DOUBLE_INDEX.find(cpu_size // 2, memory_size // 2)
+        if server_no >= 0:
+            return DSITRIBUTE_SERVER_LIST[server_no], "AB"
+    else:
+        node_key = NODE_INDEX.find(cpu_size, memory_size)  # 键为 服务器下标*2+结点
+        if node_key >= 0:
+            return DSITRIBUTE_SERVER_LIST[node_key >> 1], "B" if node_key & 1 else "A"
+    return None, None
+
+
+def find_free_nodes(cpu_size, memory_size, single_or_double, count):
+    """
+    同形状的count个虚拟机一次查询可放置的结点（容量索引支持find_many时，即'vector'策略及集群较小时的'auto'），
+    返回的结点按顺序放置不会超出剩余资源
+    :param cpu_size: 虚拟机CPU核数
+    :param memory_size: 虚拟机内存大小
+    :param single_or_double: 单/双节点
+    :param count: 虚拟机个数
+    :return: [(ServerRecord, 'A'/'B'/'AB')]，最多count个；索引不支持批量查询时为空
+    """
+    if single_or_double:
+        if not hasattr(DOUBLE_INDEX, 'find_many'):
+            return []
+        return [(DSITRIBUTE_SERVER_LIST[server_no], "AB")
+                for server_no in DOUBLE_INDEX.find_many(cpu_size // 2, memory_size // 2, count)]
+    if not hasattr(NODE_INDEX, 'find_many'):
+        return []
+    return [(DSITRIBUTE_SERVER_LIST[node_key >> 1], "B" if node_key & 1 else "A")
+            for node_key in NODE_INDEX.find_many(cpu_size, memory_size, count)]
+
+
+def allocate_vm(obj, vim_id, cpu_size, memory_size, node):
+    """
+    在服务器的结点上放置虚拟机，更新剩余资源、VM_LOCATION和容量索引
+    :param obj: ServerRecord
+    :param vim_id: 虚拟机ID
+    :param cpu_size: 虚拟机CPU核数
+    :param memory_size: 虚拟机内存大小
+    :param node: 'A'、'B'或'AB'(A、B各一半)
+    :return: 无
+    """
+    if CLUSTER.depth:
+        CLUSTER.undo_log.append(('allocate', [vim_id, cpu_size, memory_size, 1 if node == "AB" else 0]))
+    no = obj.no
+    if node == "AB":
+        cpu_size, memory_size = cpu_size // 2, memory_size // 2
+        FLEET.a_cpu[no] -= cpu_size
+        FLEET.a_memory[no] -= memory_size
+        FLEET.b_cpu[no] -= cpu_size
+        FLEET.b_memory[no] -= memory_size
+    elif node == "A":
+        FLEET.a_cpu[no] -= cpu_size
+        FLEET.a_memory[no] -= memory_size
+    else:
+        FLEET.b_cpu[no] -= cpu_size
+        FLEET.b_memory[no] -= memory_size
+    record_vm_location(vim_id, obj, node)
+    refresh_server_index(obj)
+    LEDGER.on_usage(node, cpu_size * 2 if node == "AB" else cpu_size, memory_size * 2 if node == "AB" else memory_size)
+
+
+def order_requests(add_request):
+    """
+    按主导资源(占最大服务器CPU、内存的比例较大者)从大到小排序，大的虚拟机先放
+    :param add_request: [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :return: 排序后的新列表
+    """
+    max_cpu, max_memory = max(SERVER_CATALOG.cpu), max(SERVER_CATALOG.memory)
+    return sorted(add_request, key=lambda request: -max(request[1] / max_cpu, request[2] / max_memory))
+
+
+def batch_pack(add_request, remain_days):
+    """
+    批量装箱：一天的add请求先双节点、再按主导资源占比从大到小排序，统一装箱
+    (容量索引为first_fit时即FFD，best_fit时即BFD)，排序后相邻的同形状虚拟机用find_free_nodes一次查询；
+    已有服务器放不下时，买一台按"能吸收的当天剩余需求+前瞻窗口内需求"计算单位成本最低的服务器
+    :param add_request: 当天按到达顺序的add请求 [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :param remain_days: 剩余天数
+    :return: 按原请求顺序的[(ServerRecord, 'A'/'B'/'AB')]
+    """
+    max_cpu, max_memory = max(SERVER_CATALOG.cpu), max(SERVER_CATALOG.memory)
+    order = sorted(range(len(add_request)),
+                   key=lambda i: (-add_request[i][3], -max(add_request[i][1] / max_cpu, add_request[i][2] / max_memory)))
+    pending_cpu = sum(request[1] for request in add_request) + LOOKAHEAD.pending_cpu
+    pending_memory = sum(request[2] for request in add_request) + LOOKAHEAD.pending_memory
+    for shape, run in itertools.groupby(order, key=lambda i: tuple(add_request[i][1:4])):
+        run = list(run)
+        found = find_free_nodes(*shape, len(run)) if len(run) > 1 else []
+        for n, i in enumerate(run):
+            place_request(add_request[i], found[n] if n < len(found) else None, remain_days, pending_cpu, pending_memory)
+            pending_cpu -= shape[0]
+            pending_memory -= shape[1]
+    return [VM_LOCATION[request[0]] for request in add_request]
+
+
+def place_request(vim_infos, location, remain_days, pending_cpu, pending_memory):
+    """
+    批量装箱放置一个虚拟机：没有给定位置时查找已有服务器，放不下再购买
+    :param vim_infos: [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :param location: 已查到的(ServerRecord, 'A'/'B'/'AB')，为None时现查
+    :param remain_days: 剩余天数
+    :param pending_cpu: 当天还没放置的CPU总需求（含当前虚拟机）+前瞻窗口内需求
+    :param pending_memory: 当天还没放置的内存总需求（含当前虚拟机）+前瞻窗口内需求
+    :return: 无
+    """
+    vim_id, cpu_size, memory_size, single_or_double, shape = vim_infos
+    obj, node = location or find_free_node(cpu_size, memory_size, single_or_double)
+    if obj is None:
+        start = time.perf_counter() if PROFILE else 0.0
+        server_no = SERVER_CATALOG.cheapest_for_demand(fit_table()[shape],
+                                                       pending_cpu, pending_memory, remain_days)
+        if server_no < 0:
+            raise ValueError("没有能放下虚拟机(%d, %d)的服务器" % (cpu_size, memory_size))
+        obj, node = dynamic_allocate_server(server_no, 0, 0, 1), "AB" if single_or_double else "A"
+        register_server(obj)
+        if PROFILE:
+            PROFILER.add('purchase', time.perf_counter() - start)
+    allocate_vm(obj, vim_id, cpu_size, memory_size, node)
+
+
+def operator_double_vim(add_request_double,remain_days):
     """
     处理双节点的情况
+    :param add_request_double: [vim_id, cpu, memory, 1, 形状编号]
+    :param remain_days: 包括今天在内的剩余天数，用于估算新服务器的能耗成本
     """
     for add_double_vim_infos in add_request_double:
-        cpu_size = add_double_vim_infos[1] // 2
-        memory_size = add_double_vim_infos[2] // 2
         IS_NEED_ADD_SERVER = True
-        # 检测是否能够分配
-        for obj in DSITRIBUTE_SERVER_LIST:
-            # print(add_double_vim_infos[0],cpu_size,memory_size,obj.server_name,obj.a,obj.b)
-            # yes
-            if cpu_size <= obj.a[0] and memory_size <= obj.a[1] and cpu_size <= obj.b[0] and memory_size <= obj.b[1]:
-                # print("能分配")
-            # if (cpu_size, memory_size) <= obj.a and (cpu_size, memory_size) <= obj.b:
-                obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
-                obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
-                obj.vim_id[add_double_vim_infos[0]] = add_double_vim_infos[-1]
-                IS_NEED_ADD_SERVER = False
-                break
-
-            # no
+        # 通过容量索引检测是否能够分配
+        obj, node = find_free_node(add_double_vim_infos[1], add_double_vim_infos[2], 1)
+        if obj is not None:
+            allocate_vm(obj, add_double_vim_infos[0], add_double_vim_infos[1], add_double_vim_infos[2], node)
+            IS_NEED_ADD_SERVER = False
         # 需要添加服务器
         if IS_NEED_ADD_SERVER:
             # print("需增加")
-            CHOOSE_SERVERS_TYPE += 1
-            min_cost, add_server_no = float("inf"), 0
-            # 选择最优的服务器
-            for server_no in range(CHOOSE_SERVERS_TYPE):
-                server_no = server_no % 79
-                temp_cost = dynamic_record_server_costs(server_no, day)
-                # 取花费小的服务器
-                if min_cost > temp_cost:
-                    min_cost = temp_cost
-                    add_server_no = server_no
-            # 判断此服务器是否满足分配的要求
-            if not check_can_allocate(add_server_no,cpu_size,memory_size):
-                add_server_no += 1
-                while True:
-                    if check_can_allocate(add_server_no,cpu_size,memory_size):
-                        CHOOSE_SERVERS_TYPE = add_server_no  # 记录下次能够选择的服务器类型
-                        break
-                    add_server_no += 1
-                    # CHOOSE_SERVERS_TYPE = add_server_no  # 记录下次能够选择的服务器类型
-            server = dynamic_allocate_server(add_server_no, cpu_size, memory_size, 1)  # 开辟新的服务器
-            server.vim_id.setdefault(add_double_vim_infos[0],1)  # 添加虚拟机挂件
-            # server.vim_id[add_double_vim_infos[0]] = 1
-            DSITRIBUTE_SERVER_LIST.append(server)  # 记录已分配服务器
-
-def operator_single_vim(add_request_single,CHOOSE_SERVERS_TYPE,day):
+            start = time.perf_counter() if PROFILE else 0.0
+            add_server_no = choose_server_type_ahead(add_double_vim_infos, remain_days)
+            server = dynamic_allocate_server(add_server_no, 0, 0, 1)  # 开辟新的服务器
+            register_server(server)  # 记录已分配服务器
+            if PROFILE:
+                PROFILER.add('purchase', time.perf_counter() - start)
+            allocate_vm(server, add_double_vim_infos[0], add_double_vim_infos[1], add_double_vim_infos[2], "AB")
+
+def operator_single_vim(add_request_single,remain_days):
     """
     处理单节点的情况
+    :param add_request_single: [vim_id, cpu, memory, 0, 形状编号]
+    :param remain_days: 包括今天在内的剩余天数，用于估算新服务器的能耗成本
     """
-    print("开始处理单节点")
-    IS_A_OR_B = {}  # 记录分配的是哪个节点的资源，方便进行del操作
     for add_single_vim_infos in add_request_single:
         cpu_size = add_single_vim_infos[1]
         memory_size = add_single_vim_infos[2]
         IS_NEED_ADD_SERVER = True
-        for obj in DSITRIBUTE_SERVER_LIST:
-            if cpu_size <= obj.a[0] and memory_size <= obj.a[1]:
-                # 待修改（是否采用随机选择？）（遍历选择最优？）
-                # 按照性价比的排序进行分配
-                print("A 能分配")
-                obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
-                obj.vim_id[add_single_vim_infos[0]] = add_single_vim_infos[-1]
-                # NODE_A_IS_ASSIGNED  = True
-                IS_A_OR_B.setdefault(add_single_vim_infos[0],"A")
-                IS_NEED_ADD_SERVER = False
-                break
-            elif cpu_size <= obj.b[0] and memory_size <= obj.b[1]:
-                print("B 能分配")
-                obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
-                obj.vim_id[add_single_vim_infos[0]] = add_single_vim_infos[-1]
-                IS_A_OR_B.setdefault(add_single_vim_infos[0], "B")
-                IS_NEED_ADD_SERVER = False
-                break
+        # 通过容量索引查找可分配的结点
+        obj, node = find_free_node(cpu_size, memory_size, 0)
+        if obj is not None:
+            if LOG_DEBUG:
+                LOGGER.debug("%s 能分配 %s", node, add_single_vim_infos)
+            allocate_vm(obj, add_single_vim_infos[0], cpu_size, memory_size, node)
+            IS_NEED_ADD_SERVER = False
         # 需要添加服务器
         if IS_NEED_ADD_SERVER:
-            print("需增加")
-            CHOOSE_SERVERS_TYPE += 1
-            min_cost, add_server_no = float("inf"), 0
-            # 选择最优的服务器
-            for server_no in range(CHOOSE_SERVERS_TYPE):
-                server_no = server_no % 79
-                temp_cost = dynamic_record_server_costs(server_no, day)
-                # 取花费小的服务器
-                if min_cost > temp_cost:
-                    min_cost = temp_cost
-                    add_server_no = server_no
-            if not check_can_allocate(add_server_no,cpu_size,memory_size):
-                add_server_no += 1
-                while True:
-                    if check_can_allocate(add_server_no,cpu_size,memory_size):
-                        CHOOSE_SERVERS_TYPE = add_server_no  # 记录下次能够选择的服务器类型
-                        break
-                    add_server_no += 1
-                # CHOOSE_SERVERS_TYPE = add_server_no  # 记录下次能够选择的服务器类型
-            # CHOOSE_SERVERS_TYPE = add_server_no  # 记录下次能够选择的服务器类型
-            server = dynamic_allocate_server(add_server_no, cpu_size, memory_size, 0)  # 开辟新的服务器
-            server.vim_id.setdefault(add_single_vim_infos[0], 0)  # 添加虚拟机挂件
-            DSITRIBUTE_SERVER_LIST.append(server)  # 记录已分配服务器
-
-    return IS_A_OR_B
-
-def opreator_del_vim(del_request,IS_A_OR_B):
-    print("...")
+            if LOG_DEBUG:
+                LOGGER.debug("需增加 %s", add_single_vim_infos)
+            start = time.perf_counter() if PROFILE else 0.0
+            add_server_no = choose_server_type_ahead(add_single_vim_infos, remain_days)
+            server = dynamic_allocate_server(add_server_no, 0, 0, 0)  # 开辟新的服务器
+            register_server(server)  # 记录已分配服务器
+            if PROFILE:
+                PROFILER.add('purchase', time.perf_counter() - start)
+            allocate_vm(server, add_single_vim_infos[0], cpu_size, memory_size, "A")  # 添加虚拟机挂件
+
+def opreator_del_vim(del_request):
     """
     删除虚拟机
     """
-    # temp = 0
-    # for obj in DSITRIBUTE_SERVER_LIST:
-    #     temp += list(obj.vim_id.keys())
-    # print(temp)
     for del_vim_infos in del_request:
-        # 寻找挂载虚拟机的服务器
-        for obj in DSITRIBUTE_SERVER_LIST:
-            if del_vim_infos[0] in list(obj.vim_id.keys()):
-                del obj.vim_id[del_vim_infos[0]]  # 删除挂载的节点
-                dynamic_recycle_server(obj,del_vim_infos,IS_A_OR_B)  # 更新当前服务器的资源
-                break
+        release_vm(del_vim_infos)  # 通过VM_LOCATION直接定位挂载虚拟机的服务器
 
 def test_block():
     """
-    测试区
+    测试区：DEBUG级别时输出所有服务器的状态
     """
-    print("testBlock")
+    LOGGER.debug("testBlock")
     for item in DSITRIBUTE_SERVER_LIST:
-        print(item.server_name,item.vim_id,item.a,item.b)
-        # print(item.a,item.b)
+        LOGGER.debug("%s %s %s %s", item.server_name, item.vim_id, item.a, item.b)
 
 DSITRIBUTE_SERVER_LIST = []  # 保存已经分配的服务器系信息
+NEW_SERVERS = []  # 当天新购买、还没有输出的服务器
+
+
+def assign_server_ids():
+    """
+    给当天购买的服务器分配判题器的服务器ID：同种类的服务器连续编号，种类按当天首次购买的顺序
+    :return: 当天的购买列表 [(服务器种类名, 数量)]
+    """
+    by_type = {}
+    for server in NEW_SERVERS:
+        by_type.setdefault(server.server_name, []).append(server)
+    server_id = len(DSITRIBUTE_SERVER_LIST) - len(NEW_SERVERS)
+    for servers in by_type.values():
+        for server in servers:
+            server.server_id = server_id
+            server_id += 1
+    NEW_SERVERS.clear()
+    return [(server_name, len(servers)) for server_name, servers in by_type.items()]
+
+
+def format_day_output(purchases, migrations, placements) -> str:
+    """
+    按判题器格式输出一天的结果
+    :param purchases: [(服务器种类名, 数量)]
+    :param migrations: [(vim_id, 目标ServerRecord, 'A'/'B'/'AB')]
+    :param placements: 按请求顺序的[(ServerRecord, 'A'/'B'/'AB')]
+    :return: 这一天的输出文本
+    """
+    lines = ["(purchase, %d)" % len(purchases)]
+    lines.extend("(%s, %d)" % purchase for purchase in purchases)
+    lines.append("(migration, %d)" % len(migrations))
+    for vim_id, obj, node in migrations:
+        lines.append("(%d, %d)" % (vim_id, obj.server_id) if node == "AB" else
+                     "(%d, %d, %s)" % (vim_id, obj.server_id, node))
+    for obj, node in placements:
+        lines.append("(%d)" % obj.server_id if node == "AB" else "(%d, %s)" % (obj.server_id, node))
+    return "\n".join(lines) + "\n"
 
-def distribution():
+def place_day(plan, add_request, add_request_single, add_request_double, remain_days):
+    """
+    按指定方案放置一天的add请求
+    :param plan: (分配方式, 处理顺序)，含义同DISTRIBUTION_MODE、REQUEST_ORDER
+    :param add_request: 按到达顺序的add请求 [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :param add_request_single: 其中的单节点请求
+    :param add_request_double: 其中的双节点请求
+    :param remain_days: 剩余天数
+    :return: 无
+    """
+    mode, order = plan
+    if mode == 'batch':
+        batch_pack(add_request, remain_days)  # 整天批量装箱
+        if PROFILE:
+            PROFILER.lap('batch')
+        return
+    if order == 'largest':
+        add_request_double = order_requests(add_request_double)
+        add_request_single = order_requests(add_request_single)
+    operator_double_vim(add_request_double,remain_days)  # 双节点添加
+    if PROFILE:
+        PROFILER.lap('double')
+    operator_single_vim(add_request_single,remain_days)  # 单节点添加
+    if PROFILE:
+        PROFILER.lap('single')
+
+
+def plan_day(add_request, add_request_single, add_request_double, remain_days):
+    """
+    依次试算DAY_PLANS中的方案，每个方案放完后按 硬件成本+已开机服务器每天能耗成本*剩余天数 估价并回滚，
+    最后重做最便宜的方案（最便宜的是最后一个时直接保留）
+    :param add_request: 按到达顺序的add请求 [vim_id, cpu, memory, 单/双节点, 形状编号]
+    :param add_request_single: 其中的单节点请求
+    :param add_request_double: 其中的双节点请求
+    :param remain_days: 剩余天数
+    :return: 无
+    """
+    best_plan, best_cost = None, None
+    for i, plan in enumerate(DAY_PLANS):
+        savepoint = CLUSTER.savepoint()
+        place_day(plan, add_request, add_request_single, add_request_double, remain_days)
+        cost = LEDGER.hardware_cost + LEDGER.powered_power_cost * remain_days
+        if best_cost is None or cost < best_cost:
+            best_plan, best_cost = plan, cost
+            if i == len(DAY_PLANS) - 1:
+                CLUSTER.release(savepoint)
+                return
+        CLUSTER.rollback(savepoint)
+    place_day(best_plan, add_request, add_request_single, add_request_double, remain_days)
+
+
+def distribution(requests, out=None):
     """
     分配算法
+    :param requests: 每天请求(ops, types, ids)的可迭代对象，可以是边读边产出的生成器
+    :param out: 输出流，默认sys.stdout，每天的结果一次写入
     """
-    CHOOSE_SERVERS_TYPE = 1  # 当前能选的服务器
+    global LOOKAHEAD
+    out = out or sys.stdout
+    # 预读之后K天的请求；交互输入时只能看到已经给出的天，否则会一直等待
+    LOOKAHEAD = Lookahead(requests, min(LOOKAHEAD_DAYS, VISIBLE_DAYS - 1) if VISIBLE_DAYS else LOOKAHEAD_DAYS)
     # DSITRIBUTE_SERVER_LIST = []  # 保存已经分配的服务器系信息
-    DSITRIBUTE_SERVER_LIST.append(dynamic_allocate_server(0,0,0,1))  # 初始化服务器
-    SERVER_COST = dynamic_record_server_costs(0,1)  # 记录当前需要服务器的开支（成本+能耗）
+    init_capacity_index()  # 初始化容量索引
+    register_server(dynamic_allocate_server(0,0,0,1))  # 初始化服务器
+    PROFILER.last = time.perf_counter()
     # add_request_single,add_request_double,del_request = dict(),dict(),[]
-    for day in range(1,len(OP_LIST)+1):
-        add_request_single, add_request_double, del_request = [], [], []
-        id_to_name = {}  # 保存vim id 与 name的键值对关系，方便del操作
-        for per_request in OP_LIST[day]:
-            if per_request[0] == "add":
-                vim_name, vim_id =  per_request[1], per_request[2]
-                id_to_name.setdefault(vim_id,vim_name)
-                # print(command,vim_name,vim_id)
-                vim_cpu_size, vim_memory_size, single_or_double = get_per_vim_infos(vim_name)
+    for day, (ops, types, ids) in enumerate(LOOKAHEAD, 1):
+        if PROFILE:
+            PROFILER.lap('parse')  # 等待读取、解析当天请求（含前瞻预读）
+        migrations = migration() if MIGRATION_RATIO > 0 else []  # 2、迁移，腾空轻载服务器
+        if PROFILE:
+            PROFILER.lap('migration')
+        add_request, add_request_single, add_request_double, del_request = [], [], [], []
+        for op, vm_no, vim_id in zip(ops.tolist(), types.tolist(), ids.tolist()):
+            if op == OP_ADD:
+                add_vm_operation(vm_no, vim_id)  # 保存vim id 与种类的键值对关系，跨天del也能找到
+                vim_cpu_size, vim_memory_size, single_or_double = get_per_vim_infos(vm_no)
+                shape = SHAPES.vm_shape[vm_no]  # 同一天内add后又del的虚拟机已不在SURVIVAL_VM中，形状随请求携带
+                add_request.append([vim_id,vim_cpu_size,vim_memory_size,single_or_double,shape])  # 到达顺序
                 if single_or_double:
-                    add_request_double.append([vim_id,vim_cpu_size,vim_memory_size,single_or_double])
+                    add_request_double.append([vim_id,vim_cpu_size,vim_memory_size,single_or_double,shape])
                 else:
-                    add_request_single.append([vim_id,vim_cpu_size,vim_memory_size,single_or_double])
+                    add_request_single.append([vim_id,vim_cpu_size,vim_memory_size,single_or_double,shape])
             #del
             else:
-                vim_id,vim_name = per_request[1],id_to_name[vim_id]
-                vim_cpu_size, vim_memory_size, single_or_double = get_per_vim_infos(vim_name)
+                vm_no = SURVIVAL_VM[vim_id]
+                del_vm_operation(vim_id)
+                vim_cpu_size, vim_memory_size, single_or_double = get_per_vim_infos(vm_no)
                 del_request.append([vim_id,vim_cpu_size, vim_memory_size, single_or_double])
                 # del_request([vim_id,vim_name])
-        print(len(add_request_single)+len(add_request_double)+len(del_request))
+        LOGGER.info("day %d: %d add, %d del", day, len(add_request), len(del_request))
+        if PROFILE:
+            PROFILER.lap('classify')
         # True:按cpu排序,False:按memory排序（升序）
         # if RANK_FLAG:
         #     add_request_single = dict(sorted(add_request_single.items(),key=lambda x:x[1][0]))
@@ -372,18 +1733,25 @@ def distribution():
         #     add_request_single = dict(sorted(add_request_single.items(), key=lambda x: x[1][1]))
         #     add_request_double = dict(sorted(add_request_double.items(), key=lambda x: x[1][1]))
         # 先添加双节点
-        # SERVER_COST = []
-        print(del_request)
-        operator_double_vim(add_request_double,CHOOSE_SERVERS_TYPE,day)  # 双节点添加
-        test_block()
-        IS_A_OR_B = operator_single_vim(add_request_single,CHOOSE_SERVERS_TYPE,day)  # 单节点添加
-        test_block()
+        remain_days = TOTAL_DAYS - day + 1
+        if len(DAY_PLANS) > 1:
+            plan_day(add_request, add_request_single, add_request_double, remain_days)  # 试算后选最便宜的方案
+        else:
+            place_day(DAY_PLANS[0] if DAY_PLANS else (DISTRIBUTION_MODE, REQUEST_ORDER),
+                      add_request, add_request_single, add_request_double, remain_days)
+        placements = [VM_LOCATION[request[0]] for request in add_request]  # 按请求顺序输出
+        if LOG_DEBUG:
+            test_block()
         if len(del_request) > 0:
-            opreator_del_vim(del_request,IS_A_OR_B)  # 删除
-        # test_block()
-        import time
-        time.sleep(30)
-        
+            opreator_del_vim(del_request)  # 删除
+        if PROFILE:
+            PROFILER.lap('delete')
+        LEDGER.close_day(day)
+        out.write(format_day_output(assign_server_ids(), migrations, placements))
+        out.flush()
+        if PROFILE:
+            PROFILER.lap('output')
+
         # for add_double_vim_infos in add_request_double:
         #     cpu_size = add_double_vim_infos[1] // 2
         #     memory_size = add_double_vim_infos[2] // 2
@@ -420,43 +1788,164 @@ def expansion():
     pass
 
 
+MIGRATION_LOG = []  # 每天的迁移统计 [(迁移次数, 耗时s, 每天净节省的能耗成本(腾空的 - 迁入后开机的))]
 def migration():
-    pass
+    """
+    迁移：在迁移次数上限内，从挂载虚拟机最少的服务器开始，把它们的虚拟机全部迁到其他(更满的)服务器上，
+    被腾空的服务器不再产生能耗成本；某台服务器无法完全腾空时回滚到迁移它之前的保存点。
+    空服务器在迁移期间也移出容量索引，否则迁入会让它重新开机，只是把虚拟机从一台换到另一台
+    :return: 迁移列表 [(vim_id, 目标ServerRecord, 'A'/'B'/'AB')]
+    """
+    start = time.perf_counter()
+    if sum(LEDGER.utilization()) / 4 > MIGRATION_UTILIZATION:
+        MIGRATION_LOG.append((0, time.perf_counter() - start, 0))
+        return []
+    budget = int(len(VM_LOCATION) * MIGRATION_RATIO)
+    # 按挂载的虚拟机数从少到多选出待腾空的服务器
+    candidates, planned = [], 0
+    for count in sorted(SERVERS_BY_VM_COUNT):
+        if count == 0 or planned + count > budget:
+            continue
+        # 按服务器下标而不是插入顺序遍历：回滚后同一桶内的顺序会变，不能影响之后的迁移选择
+        for obj in sorted(SERVERS_BY_VM_COUNT[count], key=lambda server: server.no):
+            if planned + count > budget:
+                break
+            if all(vim_id in LOOKAHEAD.delete_day for vim_id in obj.vim_id):
+                continue  # 前瞻窗口内会自然腾空，不占用迁移次数
+            candidates.append(obj)
+            planned += count
+    excluded = candidates + list(SERVERS_BY_VM_COUNT[0])  # 迁出的服务器和空服务器都不接收迁入
+    for obj in excluded:
+        obj.running_state = False
+        refresh_server_index(obj)
+    migrations, saved_power_cost = [], 0
+    for obj in candidates:
+        savepoint, moves, powered_on = CLUSTER.savepoint(), [], 0
+        for vim_id in sorted(obj.vim_id):  # 同上，不依赖虚拟机挂载的先后
+            vim_infos = [vim_id, *get_per_vim_infos(SURVIVAL_VM[vim_id])]
+            target, node = find_free_node(*vim_infos[1:])
+            if target is None:
+                break
+            if not target.vim_id:  # 迁入让空服务器重新开机，从节省的能耗成本中扣除
+                powered_on += SERVER_CATALOG.power_cost[target.server_no]
+            release_vm(vim_infos)
+            allocate_vm(target, *vim_infos[:3], node)
+            moves.append((vim_id, target, node))
+        if obj.vim_id:  # 没能腾空，迁回原结点
+            CLUSTER.rollback(savepoint)
+        else:
+            CLUSTER.release(savepoint)
+            migrations.extend(moves)
+            saved_power_cost += SERVER_CATALOG.power_cost[obj.server_no] - powered_on
+    for obj in excluded:
+        obj.running_state = True
+        refresh_server_index(obj)
+    MIGRATION_LOG.append((len(migrations), time.perf_counter() - start, saved_power_cost))
+    return migrations
 
 
-def main():
-    # to read standard input
-    f = open('training-1.txt', 'r')
-    sys.stdin = f
-    server_num = sys.stdin.readline()[:-1]  # ("-采购服务器类型的数量:")
-    for i in range(int(server_num)):
-        server_temp = sys.stdin.readline()[:-1]  # ("-输入(型号, CPU 核数, 内存大小, 硬件成本, 每日能耗成本)：")
-        server_type, cpu_cores, memory_size, server_cost, power_cost = server_temp[1:-1].split(',')
-        generate_server(server_type, cpu_cores, memory_size, server_cost, power_cost)
-
-    vm_num = sys.stdin.readline()[:-1]  # ("-售卖的虚拟机类型数量:")
-    for i in range(int(vm_num)):
-        vm_temp = sys.stdin.readline()[:-1]  # ("-输入(型号, CPU 核数, 内存大小, 是否双节点部署)：")
-        vm_type, vm_cpu_cores, vm_memory_size, single_or_double = vm_temp[1:-1].split(',')
-        generate_vm(vm_type, vm_cpu_cores, vm_memory_size, single_or_double)
-
-    request_days = sys.stdin.readline()[:-1]  # ("-T天的用户请求：")
-    for day in range(int(request_days)):
-        request_num = sys.stdin.readline()[:-1]  # ("-R条请求：")
-        for j in range(int(request_num)):
-            request_content = sys.stdin.readline()[:-1]  # ("-请求内容(add, 虚拟机型号, 虚拟机 ID)或(del, 虚拟机 ID)：")
-            if request_content[1] == 'a':
-                add_op, vm_type, vm_id = request_content[1:-1].split(',')
-                operation_read(day, add_op, vm_type=vm_type, vm_id=int(vm_id))
-            else:
-                del_op, vm_id = request_content[1:-1].split(',')
-                operation_read(day, del_op, vm_id=int(vm_id))
+def reset_state():
+    """
+    重置一次模拟的全部可变状态（服务器、虚拟机、索引、成本核算、迁移统计），种类表和策略参数不变
+    :return: 无
+    """
+    global LOOKAHEAD, LEDGER, CLUSTER, FLEET, NODE_INDEX, DOUBLE_INDEX, INDEX_POLICY
+    SURVIVAL_VM.clear()
+    VM_LOCATION.clear()
+    SERVERS_BY_VM_COUNT.clear()
+    DSITRIBUTE_SERVER_LIST.clear()
+    NEW_SERVERS.clear()
+    MIGRATION_LOG.clear()
+    SERVER_CATALOG.purchase_cache.clear()
+    LOOKAHEAD, LEDGER, CLUSTER, FLEET = Lookahead([], 0), CostLedger(), Cluster(), FleetStore()
+    NODE_INDEX = DOUBLE_INDEX = INDEX_POLICY = None
+
+
+STRATEGY_GRID = {  # 并行搜索的策略参数，每个组合是一次完整模拟
+    # 性价比系数决定服务器种类的编号顺序：第一台服务器买编号0的种类，成本相同的种类按编号先后选择
+    'weights': ((0.15, 0.15, 0.35, 0.35), (0.35, 0.35, 0.15, 0.15), (0.25, 0.25, 0.25, 0.25), (0, 0, 0.5, 0.1)),
+    'DISTRIBUTION_MODE': ('greedy', 'batch'),
+    'PLACEMENT_POLICY': ('auto', 'first_fit', 'best_fit'),
+    'REQUEST_ORDER': ('arrival', 'largest'),
+    'LOOKAHEAD_DAYS': (LOOKAHEAD_DAYS, 3),
+}
+BASE_CATALOG = None  # 搜索开始时的服务器种类表，每个策略按自己的性价比系数重新排序
+TUNE_REQUESTS = []  # 搜索时全部天的请求，fork出的进程直接共享
 
 
-    global SERVER_INFO
-    SERVER_INFO = sort_performance(SERVER_INFO)  # 按照性价比进行排序
-    f.close()
-    distribution()  # 1、服务器资源购买分配
+def iter_strategies():
+    """
+    按STRATEGY_GRID枚举策略，第一个是当前的默认策略
+    :return: 策略字典{全局参数名:值}的生成器
+    """
+    for values in itertools.product(*STRATEGY_GRID.values()):
+        strategy = dict(zip(STRATEGY_GRID, values))
+        if strategy['DISTRIBUTION_MODE'] == 'batch' and strategy['REQUEST_ORDER'] != 'arrival':
+            continue  # 批量装箱自己排序，处理顺序不起作用
+        strategy['A_CPU'], strategy['A_MEM'], strategy['B_CPU'], strategy['B_MEM'] = strategy.pop('weights')
+        yield strategy
+
+
+def simulate(strategy: dict):
+    """
+    用指定策略完整模拟一遍TUNE_REQUESTS（在搜索进程中执行）
+    :param strategy: {全局参数名:值}
+    :return: (总成本, 策略, 判题输出)
+    """
+    global SERVER_CATALOG
+    globals().update(strategy)
+    SERVER_CATALOG = sort_performance(BASE_CATALOG)  # 按这组性价比系数重新排序
+    reset_state()
+    out = io.StringIO()
+    distribution(TUNE_REQUESTS, out)
+    return LEDGER.hardware_cost + LEDGER.power_cost, strategy, out.getvalue()
+
+
+def tune(requests, budget: float, workers: int = None):
+    """
+    并行搜索策略：在进程池中跑多组策略的完整模拟，时间预算内选总成本最低的方案；
+    各进程fork时共享已解析的请求，模拟之间的状态由reset_state隔离
+    :param requests: 每天请求(ops, types, ids)的可迭代对象
+    :param budget: 时间预算(秒)，至少等到第一个(默认策略的)结果
+    :param workers: 进程数，默认CPU核数
+    :return: (总成本, 策略, 判题输出)
+    """
+    global BASE_CATALOG, TUNE_REQUESTS
+    if VISIBLE_DAYS:
+        raise ValueError("交互输入时之后的请求要等输出当天结果才会给出，不能先读完全部请求再搜索策略")
+    deadline = time.perf_counter() + budget
+    BASE_CATALOG, TUNE_REQUESTS = SERVER_CATALOG, list(requests)
+    best = None
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        results = pool.imap_unordered(simulate, iter_strategies())
+        while True:
+            try:
+                result = results.next(None if best is None else max(0.0, deadline - time.perf_counter()))
+            except (StopIteration, multiprocessing.TimeoutError):
+                break
+            LOGGER.info("strategy %s: total cost %d", result[1], result[0])
+            if best is None or result[0] < best[0]:
+                best = result
+    return best
+
+
+def main():
+    init_logger()
+    init_profiler()  # 设置环境变量CODECRAFT_PROFILE=路径时导出各阶段耗时(CODECRAFT_CPROFILE=1同时用cProfile采集)
+    # 读取服务器和虚拟机信息，请求按天流式解析：默认读标准输入，也可以指定训练数据路径
+    requests = load_trace(sys.argv[1]) if len(sys.argv) > 1 else load_stream(sys.stdin.buffer)
+    if READ_AHEAD_DAYS > 0:
+        requests = DayReader(requests, READ_AHEAD_DAYS)  # 分配当天时后台读取下一天
+    global SERVER_CATALOG
+    SERVER_CATALOG = sort_performance(SERVER_CATALOG)  # 按照性价比进行排序
+    if TUNE_BUDGET > 0 and VISIBLE_DAYS:
+        LOGGER.warning("交互输入不搜索策略，使用默认策略")
+    elif TUNE_BUDGET > 0:
+        sys.stdout.write(tune(requests, TUNE_BUDGET, TUNE_WORKERS)[2])  # 时间预算内最便宜的方案
+        return
+    distribution(requests)  # 1、服务器资源购买分配
+    if PROFILE:
+        PROFILER.dump(PROFILE_PATH)
 
 if __name__ == "__main__":
     main()
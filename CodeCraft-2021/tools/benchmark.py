@@ -0,0 +1,568 @@
+"""
+调度器性能测试
+用法：python tools/benchmark.py placement [--trace src/training-1.txt]
+      python tools/benchmark.py delete [--fleet-sizes 1000 5000]
+      python tools/benchmark.py parse [--trace src/training-1.txt]
+      python tools/benchmark.py modes [--trace src/training-1.txt]
+      python tools/benchmark.py pipeline --traces src/training-1.txt /tmp/training-10x.txt [--json result.json]
+      python tools/benchmark.py fleet [--fleet-sizes 10000 50000]
+合成的放大训练数据用 tools/gen_trace.py 生成
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+DEFAULT_TRACE = os.path.join(SRC_DIR, 'training-1.txt')
+
+
+def load_scheduler():
+    """
+    加载 CodeCraft-2021.py（文件名带'-'无法直接import）
+    :return: 调度器模块
+    """
+    spec = importlib.util.spec_from_file_location('codecraft', os.path.join(SRC_DIR, 'CodeCraft-2021.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_catalog(cc, trace):
+    """
+    只读取训练数据中的服务器和虚拟机信息
+    :param cc: 调度器模块
+    :param trace: 训练数据路径
+    :return: 无
+    """
+    with open(trace, 'rb') as f:
+        cc.read_catalog(f)
+    cc.SERVER_CATALOG = cc.sort_performance(cc.SERVER_CATALOG)
+
+
+def random_fleet(cc, fleet_size, rng, free):
+    """
+    生成剩余资源随机的服务器集群
+    :param cc: 调度器模块
+    :param fleet_size: 服务器数量
+    :param rng: 随机数生成器
+    :param free: 每个结点剩余资源占比的上限
+    :return: ServerRecord列表
+    """
+    fleet = []
+    cc.FLEET = cc.FleetStore()
+    for _ in range(fleet_size):
+        server_no = rng.randrange(len(cc.SERVER_CATALOG))
+        cpu, memory = cc.SERVER_CATALOG.node_cpu[server_no], cc.SERVER_CATALOG.node_memory[server_no]
+        server = cc.ServerRecord()
+        server.server_no = server_no
+        server.no = cc.FLEET.append((int(cpu * rng.random() * free), int(memory * rng.random() * free)),
+                                    (int(cpu * rng.random() * free), int(memory * rng.random() * free)))
+        fleet.append(server)
+    return fleet
+
+
+def random_day(cc, day_size, rng):
+    """
+    随机抽取一天的add请求
+    :return: [(cpu, memory, 单/双节点)]
+    """
+    return [cc.get_per_vim_infos(rng.randrange(len(cc.VM_CATALOG))) for _ in range(day_size)]
+
+
+def linear_place(fleet, day):
+    """
+    原先的线性扫描放置，作为对照
+    """
+    for cpu_size, memory_size, double in day:
+        if double:
+            cpu_size, memory_size = cpu_size // 2, memory_size // 2
+            for obj in fleet:
+                if cpu_size <= obj.a[0] and memory_size <= obj.a[1] and cpu_size <= obj.b[0] and memory_size <= obj.b[1]:
+                    obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
+                    obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
+                    break
+        else:
+            for obj in fleet:
+                if cpu_size <= obj.a[0] and memory_size <= obj.a[1]:
+                    obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
+                    break
+                elif cpu_size <= obj.b[0] and memory_size <= obj.b[1]:
+                    obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
+                    break
+
+
+def index_place(cc, fleet, day):
+    """
+    通过容量索引放置
+    """
+    for cpu_size, memory_size, double in day:
+        if double:
+            cpu_size, memory_size = cpu_size // 2, memory_size // 2
+            server_no = cc.DOUBLE_INDEX.find(cpu_size, memory_size)
+            if server_no >= 0:
+                obj = fleet[server_no]
+                obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
+                obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
+                cc.refresh_server_index(obj)
+        else:
+            node_key = cc.NODE_INDEX.find(cpu_size, memory_size)
+            if node_key >= 0:
+                obj = fleet[node_key >> 1]
+                if node_key & 1 == 0:
+                    obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
+                else:
+                    obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
+                cc.refresh_server_index(obj)
+
+
+def bench_placement(args):
+    """
+    不同集群规模下每天放置的耗时：线性扫描 vs first_fit/best_fit 容量索引 vs vector 向量化扫描
+    """
+    cc = load_scheduler()
+    load_catalog(cc, args.trace)
+    print("%8s %12s %12s %12s %12s" % ("servers", "linear(ms)", "first_fit", "best_fit", "vector"))
+    for fleet_size in args.fleet_sizes:
+        row = []
+        for policy in (None, 'first_fit', 'best_fit', 'vector'):
+            rng = random.Random(args.seed)
+            fleet = random_fleet(cc, fleet_size, rng, args.free)
+            days = [random_day(cc, args.day_size, rng) for _ in range(args.days)]
+            if policy:
+                cc.DSITRIBUTE_SERVER_LIST[:] = fleet
+                cc.init_capacity_index(policy)
+                for obj in fleet:
+                    cc.refresh_server_index(obj)
+            start = time.perf_counter()
+            for day in days:
+                if policy:
+                    index_place(cc, fleet, day)
+                else:
+                    linear_place(fleet, day)
+            row.append((time.perf_counter() - start) * 1000 / args.days)
+        print("%8d %12.2f %12.2f %12.2f %12.2f" % (fleet_size, *row))
+
+
+def delete_heavy_fleet(cc, fleet_size, vms_per_server, rng):
+    """
+    生成挂满虚拟机的集群，并登记到VM_LOCATION
+    :return: 删除请求列表 [vim_id, cpu, memory, 单/双节点]（已打乱）
+    """
+    cc.DSITRIBUTE_SERVER_LIST[:] = random_fleet(cc, fleet_size, rng, 0.5)
+    cc.VM_LOCATION.clear()
+    del_request, vim_id = [], 0
+    for obj in cc.DSITRIBUTE_SERVER_LIST:
+        for _ in range(vms_per_server):
+            cpu_size, memory_size, double = cc.get_per_vim_infos(rng.randrange(len(cc.VM_CATALOG)))
+            cc.record_vm_location(vim_id, obj, 'AB' if double else rng.choice('AB'))
+            del_request.append([vim_id, cpu_size, memory_size, double])
+            vim_id += 1
+    rng.shuffle(del_request)
+    return del_request
+
+
+def scan_delete(cc, del_request):
+    """
+    原先遍历所有服务器查找虚拟机的删除方式，作为对照
+    """
+    for del_vim_infos in del_request:
+        for obj in cc.DSITRIBUTE_SERVER_LIST:
+            if del_vim_infos[0] in list(obj.vim_id.keys()):
+                del obj.vim_id[del_vim_infos[0]]
+                node = cc.VM_LOCATION.pop(del_vim_infos[0])[1]
+                cc.dynamic_recycle_server(obj, del_vim_infos, node)
+                break
+
+
+def bench_delete(args):
+    """
+    删除密集场景：遍历查找 vs VM_LOCATION 反向索引
+    """
+    cc = load_scheduler()
+    load_catalog(cc, args.trace)
+    print("%8s %8s %14s %14s" % ("servers", "deletes", "scan(us/del)", "index(us/del)"))
+    for fleet_size in args.fleet_sizes:
+        row = []
+        for method in (scan_delete, cc.opreator_del_vim):
+            rng = random.Random(args.seed)
+            del_request = delete_heavy_fleet(cc, fleet_size, args.vms_per_server, rng)[:args.deletes]
+            cc.init_capacity_index()
+            for obj in cc.DSITRIBUTE_SERVER_LIST:
+                cc.refresh_server_index(obj)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if method is scan_delete:
+                    scan_delete(cc, del_request)
+                else:
+                    method(del_request)
+            row.append((time.perf_counter() - start) * 1e6 / len(del_request))
+        print("%8d %8d %14.1f %14.1f" % (fleet_size, len(del_request), row[0], row[1]))
+
+
+def readline_parse(cc, trace):
+    """
+    原先的逐行readline + split解析，所有天的请求都存进OP_LIST，作为对照
+    """
+    op_list = defaultdict(list)
+    with open(trace, 'r') as f:
+        server_lines = [f.readline()[:-1] for i in range(int(f.readline()))]
+        vm_lines = [f.readline()[:-1] for i in range(int(f.readline()))]
+        cc.build_catalog(server_lines, vm_lines)
+        for day in range(int(f.readline())):
+            for j in range(int(f.readline())):
+                request_content = f.readline()[:-1]
+                if request_content[1] == 'a':
+                    add_op, vm_type, vm_id = request_content[1:-1].split(',')
+                    op_list[day + 1].append([add_op, vm_type.strip(), int(vm_id)])
+                else:
+                    del_op, vm_id = request_content[1:-1].split(',')
+                    op_list[day + 1].append([del_op, int(vm_id)])
+    return op_list
+
+
+def parse_child(args):
+    """
+    在子进程中跑一种解析方式，输出耗时(s)和峰值内存(KB)
+    """
+    cc = load_scheduler()
+    start = time.perf_counter()
+    if args.variant == 'readline':
+        readline_parse(cc, args.trace)
+    else:
+        for day in cc.load_trace(args.trace, use_cache=args.variant == 'cache'):
+            pass
+    print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def bench_parse(args):
+    """
+    解析耗时和峰值内存：readline逐行解析 vs mmap流式解析 vs .npz缓存
+    在临时目录中的训练数据副本上测试，不改动原训练数据旁边已有的.npz缓存
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        trace = shutil.copy2(args.trace, workdir)  # 保留修改时间，生成的缓存对原训练数据同样有效
+        print("%-22s %10s %14s" % ("variant", "time(s)", "peak RSS(MB)"))
+        for variant, label in (('readline', 'readline + OP_LIST'), ('stream', 'mmap stream'),
+                               ('cache', 'stream + write .npz'), ('cache', 'load .npz cache')):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), 'parse', '--child',
+                                              '--variant', variant, '--trace', trace])
+            seconds, peak_kb = output.split()
+            print("%-22s %10.3f %14.1f" % (label, float(seconds), int(peak_kb) / 1024))
+        if args.keep_cache:
+            if os.path.exists(args.trace + '.npz'):
+                print("%s.npz 已存在，不覆盖" % args.trace)
+            else:
+                shutil.move(trace + '.npz', args.trace + '.npz')
+
+
+def run_distribution(trace, mode, policy):
+    """
+    用指定的分配方式和放置策略跑完整个训练数据
+    :return: (耗时s, 调度器模块)
+    """
+    cc = load_scheduler()
+    cc.DISTRIBUTION_MODE, cc.PLACEMENT_POLICY = mode, policy
+    requests = cc.load_trace(trace)
+    cc.SERVER_CATALOG = cc.sort_performance(cc.SERVER_CATALOG)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        cc.distribution(requests, devnull)
+    return time.perf_counter() - start, cc
+
+
+def bench_modes(args):
+    """
+    逐个贪心 vs 整天批量装箱：耗时、服务器数量、成本和迁移统计
+    power/day 为最后一天非空服务器的能耗成本，saved/day 为每天迁移净节省的能耗成本(腾空的 - 迁入后开机的)之和
+    """
+    print("%-8s %-10s %9s %8s %12s %10s %10s %8s %10s" % (
+        "mode", "policy", "time(s)", "servers", "hardware", "power/day", "migrations", "mig(s)", "saved/day"))
+    for mode in ('greedy', 'batch'):
+        for policy in ('first_fit', 'best_fit', 'vector', 'auto'):
+            seconds, cc = run_distribution(args.trace, mode, policy)
+            ledger, migration_log = cc.LEDGER, cc.MIGRATION_LOG or [(0, 0.0, 0)]
+            print("%-8s %-10s %9.2f %8d %12d %10d %10d %8.2f %10d" % (
+                mode, policy, seconds, ledger.servers, ledger.hardware_cost, ledger.powered_power_cost,
+                sum(day[0] for day in migration_log), sum(day[1] for day in migration_log),
+                sum(day[2] for day in migration_log)))
+
+
+class TimedRequests:
+    """
+    包装每天请求的生成器，记录每天解析耗时
+    """
+    def __init__(self, requests):
+        self.requests = requests
+        self.seconds = []
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                day = next(self.requests)
+            except StopIteration:
+                return
+            self.seconds.append(time.perf_counter() - start)
+            yield day
+
+
+class TimedWriter:
+    """
+    包装输出流：distribution()每天只写一次，借此记录每天的结束时间和输出耗时
+    """
+    def __init__(self, out):
+        self.out = out
+        self.day_ends, self.seconds = [], []
+
+    def write(self, text):
+        start = time.perf_counter()
+        self.out.write(text)
+        self.seconds.append(time.perf_counter() - start)
+        self.day_ends.append(start)
+
+    def flush(self):
+        self.out.flush()
+
+
+def percentile(values, q):
+    """
+    :return: values的q分位数
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def pipeline_child(args):
+    """
+    在子进程中跑完整流程 解析 -> 分配 -> 输出，以JSON输出各项指标
+    """
+    cc = load_scheduler()
+    cc.DISTRIBUTION_MODE, cc.PLACEMENT_POLICY = args.mode, args.policy
+    if args.lookahead is not None:
+        cc.LOOKAHEAD_DAYS = args.lookahead
+    if args.profile:
+        cc.init_profiler(os.devnull)
+    start = time.perf_counter()
+    requests = TimedRequests(cc.load_trace(args.trace))
+    cc.SERVER_CATALOG = cc.sort_performance(cc.SERVER_CATALOG)
+    catalog_seconds = time.perf_counter() - start
+    with open(os.devnull, 'w') as devnull:
+        writer = TimedWriter(devnull)
+        start = time.perf_counter()
+        cc.distribution(requests, writer)
+        total_seconds = time.perf_counter() - start
+    # 每天的分配耗时 = 上一天输出结束到当天输出之间的时间 - 当天解析耗时
+    day_starts = [start] + [end + seconds for end, seconds in zip(writer.day_ends, writer.seconds)]
+    placement = [end - begin - parse for begin, end, parse in zip(day_starts, writer.day_ends, requests.seconds)]
+    ledger = cc.LEDGER
+    print(json.dumps({
+        'trace': args.trace, 'mode': args.mode, 'policy': args.policy, 'lookahead': cc.LOOKAHEAD_DAYS,
+        'days': len(placement),
+        'seconds': {'parse': catalog_seconds + sum(requests.seconds), 'distribution': sum(placement),
+                    'output': sum(writer.seconds), 'total': catalog_seconds + total_seconds},
+        'day_placement_ms': {'p50': percentile(placement, 0.5) * 1000, 'p95': percentile(placement, 0.95) * 1000,
+                             'max': max(placement) * 1000 if placement else 0.0},
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'servers': ledger.servers, 'hardware_cost': ledger.hardware_cost, 'power_cost': ledger.power_cost,
+        'total_cost': ledger.hardware_cost + ledger.power_cost, 'series': ledger.as_dict(),
+        'profile': cc.PROFILER.as_dict() if args.profile else None,
+    }))
+
+
+def bench_pipeline(args):
+    """
+    对每份训练数据在独立子进程中跑完整流程，汇总各阶段耗时、每天分配延迟、峰值内存、服务器数量和总成本
+    """
+    results = []
+    print("%-24s %-14s %7s %7s %7s %9s %9s %8s %7s %12s" % (
+        "trace", "mode/policy", "parse", "distr", "output", "p50(ms)", "p95(ms)", "RSS(MB)", "servers",
+        "total cost"))
+    lookahead = [] if args.lookahead is None else ['--lookahead', str(args.lookahead)]
+    lookahead += ['--profile'] if args.profile else []
+    for trace in args.traces:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), 'pipeline', '--child',
+                                          '--traces', trace, '--mode', args.mode, '--policy', args.policy]
+                                         + lookahead)
+        result = json.loads(output)
+        results.append(result)
+        print("%-24s %-14s %7.2f %7.2f %7.2f %9.2f %9.2f %8.1f %7d %12d" % (
+            os.path.basename(trace)[:24], "%s/%s" % (args.mode, args.policy), result['seconds']['parse'],
+            result['seconds']['distribution'], result['seconds']['output'], result['day_placement_ms']['p50'],
+            result['day_placement_ms']['p95'], result['peak_rss_mb'], result['servers'], result['total_cost']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+class ObjectServerRecord:
+    """
+    原先的服务器对象模型（普通对象，A、B结点剩余资源为元组），作为对照
+    """
+    def __init__(self):
+        self.server_name = None
+        self.running_state = True
+        self.num = 0
+        self.no = None
+        self.server_no = None
+        self.server_id = None
+        self.a = None
+        self.b = None
+        self.vim_id = {}
+
+
+def object_fleet(cc, server_nos):
+    """
+    用原先的对象模型建立集群
+    :return: ObjectServerRecord列表
+    """
+    fleet = []
+    for no, server_no in enumerate(server_nos):
+        server = ObjectServerRecord()
+        server.no, server.server_no = no, server_no
+        server.a = server.b = (cc.SERVER_CATALOG.node_cpu[server_no], cc.SERVER_CATALOG.node_memory[server_no])
+        fleet.append(server)
+    return fleet
+
+
+def store_fleet(cc, server_nos):
+    """
+    用ServerRecord(__slots__) + FleetStore列存建立集群
+    :return: ServerRecord列表
+    """
+    cc.FLEET = cc.FleetStore()
+    fleet = []
+    for server_no in server_nos:
+        server = cc.ServerRecord()
+        server.server_no = server_no
+        node = (cc.SERVER_CATALOG.node_cpu[server_no], cc.SERVER_CATALOG.node_memory[server_no])
+        server.no = cc.FLEET.append(node, node)
+        fleet.append(server)
+    return fleet
+
+
+def object_updates(fleet, updates):
+    """
+    原先的更新方式：每次新建元组
+    """
+    for no, node, cpu_size, memory_size in updates:
+        obj = fleet[no]
+        if node:
+            obj.b = (obj.b[0] - cpu_size, obj.b[1] - memory_size)
+            obj.b = (obj.b[0] + cpu_size, obj.b[1] + memory_size)
+        else:
+            obj.a = (obj.a[0] - cpu_size, obj.a[1] - memory_size)
+            obj.a = (obj.a[0] + cpu_size, obj.a[1] + memory_size)
+
+
+def store_updates(cc, updates):
+    """
+    列存的更新方式：按行下标原地加减
+    """
+    fleet = cc.FLEET
+    for no, node, cpu_size, memory_size in updates:
+        if node:
+            fleet.b_cpu[no] -= cpu_size
+            fleet.b_memory[no] -= memory_size
+            fleet.b_cpu[no] += cpu_size
+            fleet.b_memory[no] += memory_size
+        else:
+            fleet.a_cpu[no] -= cpu_size
+            fleet.a_memory[no] -= memory_size
+            fleet.a_cpu[no] += cpu_size
+            fleet.a_memory[no] += memory_size
+
+
+def bench_fleet(args):
+    """
+    服务器状态的内存占用和更新吞吐：原先的对象模型 vs ServerRecord(__slots__) + FleetStore列存
+    （每次更新为一次放置加一次回收）
+    """
+    cc = load_scheduler()
+    load_catalog(cc, args.trace)
+    print("%8s %-8s %12s %14s" % ("servers", "model", "bytes/server", "updates/s"))
+    for fleet_size in args.fleet_sizes:
+        rng = random.Random(args.seed)
+        server_nos = [rng.randrange(len(cc.SERVER_CATALOG)) for _ in range(fleet_size)]
+        updates = []
+        for _ in range(args.updates):
+            cpu_size, memory_size, _ = cc.get_per_vim_infos(rng.randrange(len(cc.VM_CATALOG)))
+            updates.append((rng.randrange(fleet_size), rng.randrange(2), cpu_size, memory_size))
+        for model in ('object', 'store'):
+            tracemalloc.start()
+            fleet = object_fleet(cc, server_nos) if model == 'object' else store_fleet(cc, server_nos)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            start = time.perf_counter()
+            if model == 'object':
+                object_updates(fleet, updates)
+            else:
+                store_updates(cc, updates)
+            seconds = time.perf_counter() - start
+            print("%8d %-8s %12.1f %14.0f" % (fleet_size, model, memory / fleet_size, len(updates) / seconds))
+            del fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest='command')
+    placement = sub.add_parser('placement', help='每天放置耗时 vs 集群规模')
+    placement.add_argument('--trace', default=DEFAULT_TRACE)
+    placement.add_argument('--fleet-sizes', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    placement.add_argument('--day-size', type=int, default=200, help='每天的add请求数')
+    placement.add_argument('--days', type=int, default=5)
+    placement.add_argument('--free', type=float, default=0.1, help='结点剩余资源占比上限，越小集群越满')
+    placement.add_argument('--seed', type=int, default=2021)
+    placement.set_defaults(func=bench_placement)
+    delete = sub.add_parser('delete', help='删除密集场景下每次删除的耗时')
+    delete.add_argument('--trace', default=DEFAULT_TRACE)
+    delete.add_argument('--fleet-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    delete.add_argument('--vms-per-server', type=int, default=4)
+    delete.add_argument('--deletes', type=int, default=2000)
+    delete.add_argument('--seed', type=int, default=2021)
+    delete.set_defaults(func=bench_delete)
+    parse = sub.add_parser('parse', help='解析耗时和峰值内存')
+    parse.add_argument('--trace', default=DEFAULT_TRACE)
+    parse.add_argument('--keep-cache', action='store_true', help='生成的.npz缓存移到训练数据旁边（已有时不覆盖）')
+    parse.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parse.add_argument('--variant', choices=['readline', 'stream', 'cache'], help=argparse.SUPPRESS)
+    parse.set_defaults(func=lambda args: parse_child(args) if args.child else bench_parse(args))
+    modes = sub.add_parser('modes', help='greedy/batch 分配方式的耗时和成本')
+    modes.add_argument('--trace', default=DEFAULT_TRACE)
+    modes.set_defaults(func=bench_modes)
+    pipeline = sub.add_parser('pipeline', help='完整流程：各阶段耗时、每天分配延迟、峰值内存和成本')
+    pipeline.add_argument('--traces', nargs='+', default=[DEFAULT_TRACE])
+    pipeline.add_argument('--mode', choices=['greedy', 'batch'], default='greedy')
+    pipeline.add_argument('--policy', choices=['auto', 'vector', 'first_fit', 'best_fit'], default='auto')
+    pipeline.add_argument('--lookahead', type=int, help='前瞻天数K，默认使用LOOKAHEAD_DAYS')
+    pipeline.add_argument('--json', help='结果另存为JSON')
+    pipeline.add_argument('--profile', action='store_true', help='在JSON中附带各阶段耗时和计数器')
+    pipeline.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    pipeline.set_defaults(func=lambda args: pipeline_child(argparse.Namespace(**vars(args), trace=args.traces[0]))
+                          if args.child else bench_pipeline(args))
+    fleet = sub.add_parser('fleet', help='服务器状态的内存占用和更新吞吐：对象模型 vs 列存')
+    fleet.add_argument('--trace', default=DEFAULT_TRACE)
+    fleet.add_argument('--fleet-sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    fleet.add_argument('--updates', type=int, default=500000)
+    fleet.add_argument('--seed', type=int, default=2021)
+    fleet.set_defaults(func=bench_fleet)
+    args = parser.parse_args()
+    if not hasattr(args, 'func'):
+        parser.print_help()
+        return
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+按训练数据的统计特征生成放大的合成训练数据（格式相同，随机种子固定可复现）
+用法：python tools/gen_trace.py --scale 10 --seed 2021 -o /tmp/training-10x.txt
+"""
+import argparse
+import os
+import random
+import re
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+DEFAULT_TRACE = os.path.join(SRC_DIR, 'training-1.txt')
+REQUEST_PATTERN = re.compile(r'\((add|del),\s*(?:([^,\s)]+),\s*)?(\d+)\)')
+
+
+def read_profile(trace):
+    """
+    读取训练数据的服务器/虚拟机信息行，以及每天的add/del数量和虚拟机型号分布
+    :param trace: 训练数据路径
+    :return: (服务器信息行, 虚拟机信息行, [(add数, del数)], [add的虚拟机型号])
+    """
+    with open(trace, 'r') as f:
+        server_lines = [f.readline().strip() for _ in range(int(f.readline()))]
+        vm_lines = [f.readline().strip() for _ in range(int(f.readline()))]
+        day_counts, vm_types = [], []
+        for _ in range(int(f.readline())):
+            adds = dels = 0
+            for _ in range(int(f.readline())):
+                op, vm_type, _ = REQUEST_PATTERN.match(f.readline().strip()).groups()
+                if op == 'add':
+                    adds += 1
+                    vm_types.append(vm_type)
+                else:
+                    dels += 1
+            day_counts.append((adds, dels))
+    return server_lines, vm_lines, day_counts, vm_types
+
+
+def generate(trace, scale, seed, days=None):
+    """
+    生成合成训练数据：每天的add/del数量是原数据的scale倍，虚拟机型号按原数据的频率抽样，
+    del从当时存活的虚拟机中随机选择
+    :param trace: 作为模板的训练数据
+    :param scale: 请求量放大倍数
+    :param seed: 随机种子
+    :param days: 天数，默认与原数据相同（超出时循环使用每天的数量）
+    :return: 按行的生成器
+    """
+    rng = random.Random(seed)
+    server_lines, vm_lines, day_counts, vm_types = read_profile(trace)
+    yield str(len(server_lines))
+    yield from server_lines
+    yield str(len(vm_lines))
+    yield from vm_lines
+    days = days or len(day_counts)
+    yield str(days)
+    alive, next_id = [], rng.randrange(10 ** 8, 9 * 10 ** 8)
+    for day in range(days):
+        adds, dels = day_counts[day % len(day_counts)]
+        ops = ['add'] * int(adds * scale) + ['del'] * int(dels * scale)
+        rng.shuffle(ops)
+        requests = []
+        for op in ops:
+            if op == 'add':
+                requests.append("(add, %s, %d)" % (rng.choice(vm_types), next_id))
+                alive.append(next_id)
+                next_id += 1
+            elif alive:
+                i = rng.randrange(len(alive))
+                alive[i], alive[-1] = alive[-1], alive[i]
+                requests.append("(del, %d)" % alive.pop())
+        yield str(len(requests))
+        yield from requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--trace', default=DEFAULT_TRACE, help='作为模板的训练数据')
+    parser.add_argument('--scale', type=float, default=10, help='请求量放大倍数')
+    parser.add_argument('--days', type=int, help='天数，默认与模板相同')
+    parser.add_argument('--seed', type=int, default=2021)
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+    with open(args.output, 'w') as f:
+        for line in generate(args.trace, args.scale, args.seed, args.days):
+            f.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()